@@ -0,0 +1,511 @@
+"""Rapoarte de vânzări din tabele de agregare zilnice, întreținute incremental.
+
+Rulare: python analytics.py rebuild|compact
+  rebuild  recalculează agregatele din orders + order_content
+  compact  mută diferențele acumulate în agregate (o dată)
+
+sales_daily_product / _customer / _employee țin, pe zi, venitul, bucățile și
+numărul de comenzi necanulate. Trigger-ele pe orders și order_content trimit
+diferențele (rânduri sales_rollup_delta) către analytics_apply(), care doar le
+adaugă în sales_rollup_log: checkout-ul nu blochează niciun rând de agregat.
+analytics_compact() (Compactor, periodic, și înaintea fiecărui raport) le
+adună în agregate; rapoartele citesc doar agregatele, deci costul lor
+depinde de intervalul cerut, nu de istoricul comenzilor.
+"""
+import logging
+import os
+import sys
+import threading
+from datetime import date, timedelta
+
+log = logging.getLogger(__name__)
+
+# Trigger-ul pe order_content (folosit de migrările 8 și 9)
+ORDER_CONTENT_ROLLUP_FN = """
+    -- Rânduri noi / modificate / șterse în order_content (doar pentru comenzi necanulate)
+    CREATE OR REPLACE FUNCTION trg_order_content_rollup_fn() RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        deltas sales_rollup_delta[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            deltas := ARRAY(
+                SELECT ROW(analytics_day(o.data), o.id_client, o.id_employee, o.id_order,
+                           n.id_product, n.quantity, n.quantity * n.price, 0)::sales_rollup_delta
+                FROM new_rows n JOIN orders o ON o.id_order = n.id_order
+                WHERE o.progress <> 'cancelled');
+        ELSIF TG_OP = 'UPDATE' THEN
+            -- editare (ex. cantitate): rândul vechi se scade, cel nou se adaugă
+            deltas := ARRAY(
+                SELECT ROW(analytics_day(o.data), o.id_client, o.id_employee, o.id_order,
+                           x.id_product, x.sign * x.quantity, x.sign * x.quantity * x.price,
+                           0)::sales_rollup_delta
+                FROM (
+                    SELECT d.id_order, d.id_product, d.quantity, d.price, -1 AS sign
+                    FROM old_rows d JOIN new_rows n USING (id_item)
+                    WHERE (d.id_order, d.id_product, d.quantity, d.price)
+                          IS DISTINCT FROM (n.id_order, n.id_product, n.quantity, n.price)
+                    UNION ALL
+                    SELECT n.id_order, n.id_product, n.quantity, n.price, 1 AS sign
+                    FROM old_rows d JOIN new_rows n USING (id_item)
+                    WHERE (d.id_order, d.id_product, d.quantity, d.price)
+                          IS DISTINCT FROM (n.id_order, n.id_product, n.quantity, n.price)
+                ) x
+                JOIN orders o ON o.id_order = x.id_order
+                WHERE o.progress <> 'cancelled');
+        ELSE
+            -- la ștergerea comenzii (cascade) rândul din orders nu mai e vizibil;
+            -- acel caz e tratat de trg_orders_rollup_del
+            deltas := ARRAY(
+                SELECT ROW(analytics_day(o.data), o.id_client, o.id_employee, o.id_order,
+                           d.id_product, -d.quantity, -(d.quantity * d.price), 0)::sales_rollup_delta
+                FROM old_rows d JOIN orders o ON o.id_order = d.id_order
+                WHERE o.progress <> 'cancelled');
+        END IF;
+        IF cardinality(deltas) > 0 THEN
+            PERFORM analytics_apply(deltas);
+        END IF;
+        RETURN NULL;
+    END; $$;
+"""
+
+# Migrarea 8: tabelele de agregare, funcțiile și trigger-ele
+SCHEMA = """
+    -- Ziua de raportare a unei comenzi (ora României)
+    CREATE OR REPLACE FUNCTION analytics_day(ts TIMESTAMPTZ) RETURNS DATE
+    LANGUAGE sql IMMUTABLE AS $$ SELECT (ts AT TIME ZONE 'Europe/Bucharest')::date $$;
+
+    CREATE TABLE IF NOT EXISTS sales_daily_product (
+        day DATE NOT NULL,
+        id_product INTEGER NOT NULL,
+        revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+        units BIGINT NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, id_product)
+    );
+    CREATE INDEX IF NOT EXISTS idx_sales_daily_product_product ON sales_daily_product (id_product, day);
+    CREATE TABLE IF NOT EXISTS sales_daily_customer (
+        day DATE NOT NULL,
+        id_client INTEGER NOT NULL,
+        revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+        units BIGINT NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, id_client)
+    );
+    CREATE TABLE IF NOT EXISTS sales_daily_employee (
+        day DATE NOT NULL,
+        id_employee INTEGER NOT NULL,
+        revenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+        units BIGINT NOT NULL DEFAULT 0,
+        orders INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, id_employee)
+    );
+
+    -- O diferență de aplicat: un rând de comandă (id_product setat) sau comanda însăși (orders = ±1)
+    CREATE TYPE sales_rollup_delta AS (
+        day DATE, id_client INTEGER, id_employee INTEGER, id_order INTEGER,
+        id_product INTEGER, units BIGINT, revenue NUMERIC, orders INTEGER
+    );
+
+    CREATE OR REPLACE FUNCTION analytics_apply(deltas sales_rollup_delta[]) RETURNS VOID
+    LANGUAGE sql AS $$
+        -- ORDER BY: rândurile de agregat se blochează mereu în aceeași ordine (fără deadlock)
+        INSERT INTO sales_daily_product AS t (day, id_product, revenue, units, orders)
+        SELECT day, id_product, SUM(revenue), SUM(units),
+               COUNT(DISTINCT id_order) FILTER (WHERE units > 0)
+               - COUNT(DISTINCT id_order) FILTER (WHERE units < 0)
+        FROM unnest(deltas)
+        WHERE id_product IS NOT NULL
+        GROUP BY day, id_product
+        ORDER BY day, id_product
+        ON CONFLICT (day, id_product) DO UPDATE
+            SET revenue = t.revenue + EXCLUDED.revenue,
+                units = t.units + EXCLUDED.units,
+                orders = t.orders + EXCLUDED.orders;
+        INSERT INTO sales_daily_customer AS t (day, id_client, revenue, units, orders)
+        SELECT day, id_client, SUM(revenue), SUM(units), SUM(orders)
+        FROM unnest(deltas)
+        GROUP BY day, id_client
+        ORDER BY day, id_client
+        ON CONFLICT (day, id_client) DO UPDATE
+            SET revenue = t.revenue + EXCLUDED.revenue,
+                units = t.units + EXCLUDED.units,
+                orders = t.orders + EXCLUDED.orders;
+        INSERT INTO sales_daily_employee AS t (day, id_employee, revenue, units, orders)
+        SELECT day, id_employee, SUM(revenue), SUM(units), SUM(orders)
+        FROM unnest(deltas)
+        GROUP BY day, id_employee
+        ORDER BY day, id_employee
+        ON CONFLICT (day, id_employee) DO UPDATE
+            SET revenue = t.revenue + EXCLUDED.revenue,
+                units = t.units + EXCLUDED.units,
+                orders = t.orders + EXCLUDED.orders;
+    $$;
+""" + ORDER_CONTENT_ROLLUP_FN + """
+
+    -- Comenzi noi și schimbări de status (anulare / reactivare), zi, client sau angajat
+    CREATE OR REPLACE FUNCTION trg_orders_rollup_fn() RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        deltas sales_rollup_delta[];
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            deltas := ARRAY(
+                SELECT ROW(analytics_day(n.data), n.id_client, n.id_employee, n.id_order,
+                           NULL, 0, 0, 1)::sales_rollup_delta
+                FROM new_rows n
+                WHERE n.progress <> 'cancelled');
+        ELSE
+            -- versiunea veche se scade, cea nouă se adaugă, cu tot cu rândurile comenzii
+            deltas := ARRAY(
+                SELECT ROW(analytics_day(x.data), x.id_client, x.id_employee, x.id_order,
+                           l.id_product, x.sign * l.quantity, x.sign * l.revenue,
+                           CASE WHEN l.id_product IS NULL THEN x.sign ELSE 0 END)::sales_rollup_delta
+                FROM (
+                    SELECT o.data, o.id_client, o.id_employee, o.id_order, -1 AS sign, o.progress
+                    FROM old_rows o JOIN new_rows n ON n.id_order = o.id_order
+                    WHERE (analytics_day(o.data), o.id_client, o.id_employee, o.progress <> 'cancelled')
+                          IS DISTINCT FROM
+                          (analytics_day(n.data), n.id_client, n.id_employee, n.progress <> 'cancelled')
+                    UNION ALL
+                    SELECT n.data, n.id_client, n.id_employee, n.id_order, 1 AS sign, n.progress
+                    FROM old_rows o JOIN new_rows n ON n.id_order = o.id_order
+                    WHERE (analytics_day(o.data), o.id_client, o.id_employee, o.progress <> 'cancelled')
+                          IS DISTINCT FROM
+                          (analytics_day(n.data), n.id_client, n.id_employee, n.progress <> 'cancelled')
+                ) x
+                CROSS JOIN LATERAL (
+                    SELECT NULL::integer AS id_product, 0::bigint AS quantity, 0::numeric AS revenue
+                    UNION ALL
+                    SELECT oc.id_product, oc.quantity, oc.quantity * oc.price
+                    FROM order_content oc WHERE oc.id_order = x.id_order
+                ) l
+                WHERE x.progress <> 'cancelled');
+        END IF;
+        IF cardinality(deltas) > 0 THEN
+            PERFORM analytics_apply(deltas);
+        END IF;
+        RETURN NULL;
+    END; $$;
+
+    -- Ștergerea unei comenzi: se scade înainte ca rândurile ei să dispară prin cascade
+    CREATE OR REPLACE FUNCTION trg_orders_rollup_del_fn() RETURNS TRIGGER
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF OLD.progress <> 'cancelled' THEN
+            PERFORM analytics_apply(ARRAY(
+                SELECT ROW(analytics_day(OLD.data), OLD.id_client, OLD.id_employee, OLD.id_order,
+                           l.id_product, -l.quantity, -l.revenue,
+                           CASE WHEN l.id_product IS NULL THEN -1 ELSE 0 END)::sales_rollup_delta
+                FROM (
+                    SELECT NULL::integer AS id_product, 0::bigint AS quantity, 0::numeric AS revenue
+                    UNION ALL
+                    SELECT oc.id_product, oc.quantity, oc.quantity * oc.price
+                    FROM order_content oc WHERE oc.id_order = OLD.id_order
+                ) l));
+        END IF;
+        RETURN OLD;
+    END; $$;
+
+    CREATE TRIGGER trg_order_content_rollup_ins AFTER INSERT ON order_content
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION trg_order_content_rollup_fn();
+    CREATE TRIGGER trg_order_content_rollup_del AFTER DELETE ON order_content
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION trg_order_content_rollup_fn();
+    CREATE TRIGGER trg_orders_rollup_ins AFTER INSERT ON orders
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION trg_orders_rollup_fn();
+    CREATE TRIGGER trg_orders_rollup_upd AFTER UPDATE ON orders
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION trg_orders_rollup_fn();
+    CREATE TRIGGER trg_orders_rollup_del BEFORE DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION trg_orders_rollup_del_fn();
+"""
+
+# Migrarea 9: editările din order_content (trg_before_update_order_content permite
+# schimbarea cantității) ajung și ele în agregate
+CONTENT_UPDATE = ORDER_CONTENT_ROLLUP_FN + """
+    CREATE TRIGGER trg_order_content_rollup_upd AFTER UPDATE ON order_content
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION trg_order_content_rollup_fn();
+"""
+
+# Recalculare completă folosită de migrările 8 și 9 (înainte de sales_rollup_log)
+REBUILD_TOTALS = """
+    TRUNCATE sales_daily_product, sales_daily_customer, sales_daily_employee;
+    CREATE TEMP TABLE rollup_orders ON COMMIT DROP AS
+    SELECT o.id_order, analytics_day(o.data) AS day, o.id_client, o.id_employee,
+           COALESCE(SUM(oc.quantity * oc.price), 0) AS revenue,
+           COALESCE(SUM(oc.quantity), 0)            AS units
+    FROM orders o
+    LEFT JOIN order_content oc ON oc.id_order = o.id_order
+    WHERE o.progress <> 'cancelled'
+    GROUP BY o.id_order;
+    INSERT INTO sales_daily_product (day, id_product, revenue, units, orders)
+    SELECT r.day, oc.id_product, SUM(oc.quantity * oc.price), SUM(oc.quantity),
+           COUNT(DISTINCT r.id_order)
+    FROM rollup_orders r JOIN order_content oc ON oc.id_order = r.id_order
+    GROUP BY r.day, oc.id_product;
+    INSERT INTO sales_daily_customer (day, id_client, revenue, units, orders)
+    SELECT day, id_client, SUM(revenue), SUM(units), COUNT(*)
+    FROM rollup_orders GROUP BY day, id_client;
+    INSERT INTO sales_daily_employee (day, id_employee, revenue, units, orders)
+    SELECT day, id_employee, SUM(revenue), SUM(units), COUNT(*)
+    FROM rollup_orders GROUP BY day, id_employee;
+"""
+
+# Migrarea 10: trigger-ele scriu doar într-un jurnal append-only, fără lock pe agregate.
+# sales_order_product ține cantitatea netă per (zi, comandă, produs), ca
+# analytics_compact să știe exact când o comandă începe / încetează să conțină un
+# produs (contorul orders din sales_daily_product), oricâte instrucțiuni au atins-o.
+LOG_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sales_rollup_log (
+        day DATE NOT NULL, id_client INTEGER, id_employee INTEGER, id_order INTEGER,
+        id_product INTEGER, units BIGINT NOT NULL, revenue NUMERIC NOT NULL, orders INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS sales_order_product (
+        day DATE NOT NULL,
+        id_order INTEGER NOT NULL,
+        id_product INTEGER NOT NULL,
+        units BIGINT NOT NULL,
+        PRIMARY KEY (day, id_order, id_product)
+    );
+
+    CREATE OR REPLACE FUNCTION analytics_apply(deltas sales_rollup_delta[]) RETURNS VOID
+    LANGUAGE sql AS $$
+        INSERT INTO sales_rollup_log (day, id_client, id_employee, id_order, id_product,
+                                      units, revenue, orders)
+        SELECT day, id_client, id_employee, id_order, id_product, units, revenue, orders
+        FROM unnest(deltas);
+    $$;
+
+    -- Adună jurnalul în agregate; întoarce numărul de diferențe consumate.
+    -- Consumă doar rândurile deja comise (DELETE ... RETURNING), deci fiecare
+    -- diferență intră o singură dată; rulările concurente se serializează.
+    CREATE OR REPLACE FUNCTION analytics_compact() RETURNS INTEGER
+    LANGUAGE plpgsql AS $$
+    DECLARE
+        n INTEGER;
+    BEGIN
+        PERFORM pg_advisory_xact_lock(72710024);
+        CREATE TEMP TABLE rollup_batch (LIKE sales_rollup_log) ON COMMIT DROP;
+        WITH taken AS (DELETE FROM sales_rollup_log RETURNING *)
+        INSERT INTO rollup_batch SELECT * FROM taken;
+        GET DIAGNOSTICS n = ROW_COUNT;
+        IF n > 0 THEN
+            INSERT INTO sales_daily_customer AS t (day, id_client, revenue, units, orders)
+            SELECT day, id_client, SUM(revenue), SUM(units), SUM(orders)
+            FROM rollup_batch GROUP BY day, id_client ORDER BY day, id_client
+            ON CONFLICT (day, id_client) DO UPDATE
+                SET revenue = t.revenue + EXCLUDED.revenue,
+                    units = t.units + EXCLUDED.units,
+                    orders = t.orders + EXCLUDED.orders;
+            INSERT INTO sales_daily_employee AS t (day, id_employee, revenue, units, orders)
+            SELECT day, id_employee, SUM(revenue), SUM(units), SUM(orders)
+            FROM rollup_batch GROUP BY day, id_employee ORDER BY day, id_employee
+            ON CONFLICT (day, id_employee) DO UPDATE
+                SET revenue = t.revenue + EXCLUDED.revenue,
+                    units = t.units + EXCLUDED.units,
+                    orders = t.orders + EXCLUDED.orders;
+
+            CREATE TEMP TABLE rollup_lines ON COMMIT DROP AS
+            SELECT l.day, l.id_order, l.id_product, l.units, l.revenue,
+                   COALESCE(p.units, 0) AS prev_units
+            FROM (SELECT day, id_order, id_product, SUM(units) AS units, SUM(revenue) AS revenue
+                  FROM rollup_batch WHERE id_product IS NOT NULL
+                  GROUP BY day, id_order, id_product) l
+            LEFT JOIN sales_order_product p USING (day, id_order, id_product);
+            INSERT INTO sales_daily_product AS t (day, id_product, revenue, units, orders)
+            SELECT day, id_product, SUM(revenue), SUM(units),
+                   COUNT(*) FILTER (WHERE prev_units <= 0 AND prev_units + units > 0)
+                   - COUNT(*) FILTER (WHERE prev_units > 0 AND prev_units + units <= 0)
+            FROM rollup_lines GROUP BY day, id_product ORDER BY day, id_product
+            ON CONFLICT (day, id_product) DO UPDATE
+                SET revenue = t.revenue + EXCLUDED.revenue,
+                    units = t.units + EXCLUDED.units,
+                    orders = t.orders + EXCLUDED.orders;
+            INSERT INTO sales_order_product AS t (day, id_order, id_product, units)
+            SELECT day, id_order, id_product, units FROM rollup_lines
+            ON CONFLICT (day, id_order, id_product) DO UPDATE SET units = t.units + EXCLUDED.units;
+            DELETE FROM sales_order_product p
+            USING rollup_lines l
+            WHERE (p.day, p.id_order, p.id_product) = (l.day, l.id_order, l.id_product)
+              AND p.units = 0;
+            -- agregatele ajunse la zero dispar, ca după REBUILD
+            DELETE FROM sales_daily_product t USING rollup_lines l
+            WHERE t.day = l.day AND t.id_product = l.id_product
+              AND t.revenue = 0 AND t.units = 0 AND t.orders = 0;
+            DELETE FROM sales_daily_customer t USING rollup_batch b
+            WHERE t.day = b.day AND t.id_client = b.id_client
+              AND t.revenue = 0 AND t.units = 0 AND t.orders = 0;
+            DELETE FROM sales_daily_employee t USING rollup_batch b
+            WHERE t.day = b.day AND t.id_employee = b.id_employee
+              AND t.revenue = 0 AND t.units = 0 AND t.orders = 0;
+            DROP TABLE rollup_lines;
+        END IF;
+        DROP TABLE rollup_batch;
+        RETURN n;
+    END; $$;
+"""
+
+# Recalculare completă (backfill la migrare sau reparare); golește și jurnalul,
+# sub același lock ca analytics_compact
+REBUILD = """
+    SELECT pg_advisory_xact_lock(72710024);
+    TRUNCATE sales_rollup_log, sales_order_product,
+             sales_daily_product, sales_daily_customer, sales_daily_employee;
+    CREATE TEMP TABLE rollup_orders ON COMMIT DROP AS
+    SELECT o.id_order, analytics_day(o.data) AS day, o.id_client, o.id_employee,
+           COALESCE(SUM(oc.quantity * oc.price), 0) AS revenue,
+           COALESCE(SUM(oc.quantity), 0)            AS units
+    FROM orders o
+    LEFT JOIN order_content oc ON oc.id_order = o.id_order
+    WHERE o.progress <> 'cancelled'
+    GROUP BY o.id_order;
+    INSERT INTO sales_order_product (day, id_order, id_product, units)
+    SELECT r.day, r.id_order, oc.id_product, SUM(oc.quantity)
+    FROM rollup_orders r JOIN order_content oc ON oc.id_order = r.id_order
+    GROUP BY r.day, r.id_order, oc.id_product
+    HAVING SUM(oc.quantity) <> 0;
+    -- o comandă contează la un produs cât timp cantitatea ei netă din el e pozitivă
+    INSERT INTO sales_daily_product (day, id_product, revenue, units, orders)
+    SELECT r.day, oc.id_product, SUM(oc.quantity * oc.price), SUM(oc.quantity),
+           (SELECT COUNT(*) FROM sales_order_product p
+            WHERE p.day = r.day AND p.id_product = oc.id_product AND p.units > 0)
+    FROM rollup_orders r JOIN order_content oc ON oc.id_order = r.id_order
+    GROUP BY r.day, oc.id_product;
+    INSERT INTO sales_daily_customer (day, id_client, revenue, units, orders)
+    SELECT day, id_client, SUM(revenue), SUM(units), COUNT(*)
+    FROM rollup_orders GROUP BY day, id_client;
+    INSERT INTO sales_daily_employee (day, id_employee, revenue, units, orders)
+    SELECT day, id_employee, SUM(revenue), SUM(units), COUNT(*)
+    FROM rollup_orders GROUP BY day, id_employee;
+    DROP TABLE rollup_orders;
+"""
+
+# Rapoartele disponibile la /api/reports/<nume>; toate primesc %(start)s și %(end)s (inclusiv)
+REPORTS = {
+    "daily": """
+        SELECT day, SUM(revenue) AS revenue, SUM(units) AS units, SUM(orders) AS orders
+        FROM sales_daily_employee
+        WHERE day BETWEEN %(start)s AND %(end)s
+        GROUP BY day ORDER BY day
+    """,
+    "products": """
+        SELECT r.id_product, s.name,
+               SUM(r.revenue) AS revenue, SUM(r.units) AS units, SUM(r.orders) AS orders
+        FROM sales_daily_product r
+        JOIN stock s ON s.id_product = r.id_product
+        WHERE r.day BETWEEN %(start)s AND %(end)s
+        GROUP BY r.id_product, s.name
+        ORDER BY revenue DESC, r.id_product
+        LIMIT %(limit)s
+    """,
+    "product_daily": """
+        SELECT day, revenue, units, orders
+        FROM sales_daily_product
+        WHERE id_product = %(id)s AND day BETWEEN %(start)s AND %(end)s
+        ORDER BY day
+    """,
+    "customers": """
+        SELECT r.id_client, c.name, c.surname,
+               SUM(r.revenue) AS revenue, SUM(r.units) AS units, SUM(r.orders) AS orders
+        FROM sales_daily_customer r
+        JOIN customers c ON c.id_customer = r.id_client
+        WHERE r.day BETWEEN %(start)s AND %(end)s
+        GROUP BY r.id_client, c.name, c.surname
+        ORDER BY revenue DESC, r.id_client
+        LIMIT %(limit)s
+    """,
+    "employees": """
+        SELECT r.id_employee, e.name, e.surname, e.department,
+               SUM(r.revenue) AS revenue, SUM(r.units) AS units, SUM(r.orders) AS orders
+        FROM sales_daily_employee r
+        JOIN employees e ON e.id = r.id_employee
+        WHERE r.day BETWEEN %(start)s AND %(end)s
+        GROUP BY r.id_employee, e.name, e.surname, e.department
+        ORDER BY revenue DESC, r.id_employee
+        LIMIT %(limit)s
+    """,
+}
+
+
+def report(db, name, start=None, end=None, limit=50, id=None):
+    # Rulează raportul `name` pe intervalul [start, end] (implicit ultimele 30 de zile)
+    if name not in REPORTS:
+        raise ValueError(f"Raport necunoscut: {name}")
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    compact(db)  # raportul include și diferențele încă necompactate
+    with db.connection:
+        db.cursor.execute(REPORTS[name], {"start": start, "end": end, "limit": limit, "id": id})
+        return db.cursor.fetchall()
+
+
+def rebuild(db):
+    with db.connection:
+        db.cursor.execute(REBUILD)
+
+
+def compact(db):
+    # Adună jurnalul în agregate; întoarce numărul de diferențe consumate
+    with db.connection:
+        db.cursor.execute("SELECT analytics_compact() AS n")
+        return db.cursor.fetchone()["n"]
+
+
+class Compactor:
+    """Fir care rulează periodic analytics_compact, ca jurnalul să rămână mic."""
+
+    def __init__(self, db, interval=None):
+        self.db = db
+        self.interval = float(interval or os.getenv("ANALYTICS_COMPACT_INTERVAL") or 30)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        # Pornește firul (o singură dată)
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="analytics-compact",
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                compact(self.db)
+            except Exception:
+                log.exception("compactarea agregatelor de vânzări a eșuat")
+            finally:
+                self.db.release()
+
+
+def main(argv):
+    from db import Database
+
+    if argv not in (["rebuild"], ["compact"]):
+        print(__doc__)
+        return 2
+    db = Database()
+    try:
+        if argv == ["rebuild"]:
+            rebuild(db)
+            print("Agregatele de vânzări au fost recalculate.")
+        else:
+            print(f"Diferențe compactate: {compact(db)}")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
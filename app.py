@@ -1,16 +1,187 @@
+import base64
+import io
 import os
 import traceback
+from datetime import date, datetime
 
 from dotenv import load_dotenv
-from flask import Flask, jsonify, render_template, request, session, redirect, url_for
+from flask import (Flask, jsonify, render_template, request, session, redirect, url_for,
+                   has_request_context, stream_with_context)
 
+import analytics
+import bulk
+from cache import CatalogCache
 from db import Database
+from jobs import ProductionWorker
+from mrp import BOMCycleError, run_mrp
+from passwords import LoginThrottled, PasswordPoolBusy
+from profiler import RequestProfiler
+from search import MODES as SEARCH_MODES, ProductSearch
 
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "change_this_in_prod")
 database = Database()
+if database.instrumentation is not None:
+    # Interogările lente sunt logate împreună cu ruta care le-a generat
+    database.instrumentation.route = lambda: (
+        f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+        if has_request_context() else None)
+catalog_cache = CatalogCache(dumps=app.json.dumps)
+profiler = RequestProfiler(app, database.instrumentation)
+product_search = ProductSearch(database)
+database.on_stock_change(catalog_cache.invalidate)
+production_worker = ProductionWorker(database)
+rollup_compactor = analytics.Compactor(database)
 STATUSES = ['pending', 'processing', 'shipped', 'completed', 'cancelled']
+# Departamentele care pot exporta / importa în masă fiecare entitate
+BULK_DEPARTMENTS = {
+    'stock': ('achizitii', 'productie'),
+    'partner_products': ('achizitii',),
+    'recipes': ('productie',),
+}
+# Mărimea implicită a paginii pentru listele de comenzi (fără ?limit)
+ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE") or 50)
+# Câte rânduri se serializează într-un singur fragment al răspunsului streaming
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS") or 500)
+
+
+@app.before_request
+def start_background_workers():
+    # Pornite la primul request, nu la import: sub reloader-ul Flask modulul e importat
+    # și în procesul care doar urmărește fișierele (start() e idempotent)
+    production_worker.start()
+    rollup_compactor.start()
+
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    # Conexiunea luată din pool pentru request-ul curent se întoarce în pool
+    database.release()
+
+
+def encode_cursor(ts, row_id):
+    # Cursor opac pentru paginare keyset: (timestamp, id) codificat base64
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(token):
+    # Inversul lui encode_cursor; ridică ValueError pentru un cursor invalid
+    try:
+        ts, row_id = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception as exc:
+        raise ValueError('Cursor invalid') from exc
+
+
+def page_args(default=None):
+    # Citește ?limit=&after= din query string; limit lipsă = default (None = fără paginare)
+    limit = request.args.get('limit', default, type=int)
+    if limit is not None and not 1 <= limit <= 500:
+        raise ValueError('limit trebuie între 1 și 500')
+    after = request.args.get('after')
+    return limit, (decode_cursor(after) if after else None)
+
+
+def cached_json(key, loader):
+    # Răspuns JSON din cache-ul de catalog, cu ETag; 304 dacă clientul are deja versiunea
+    entry = catalog_cache.get_or_load(key, loader)
+    if entry is None:
+        return jsonify({'error': 'No products'}), 404
+    etag, body = entry
+    resp = app.response_class(body, mimetype='application/json')
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+
+def paged_response(rows, limit, ts_key, id_key):
+    # Răspuns JSON listă; cursorul paginii următoare vine în header-ul X-Next-Cursor
+    resp = jsonify(rows)
+    if limit is not None and len(rows) == limit:
+        last = rows[-1]
+        resp.headers['X-Next-Cursor'] = encode_cursor(last[ts_key], last[id_key])
+    return resp
+
+
+def session_principal(name_key, id_key, lookup):
+    # Id-ul numeric din sesiune (pus la login); sesiunile mai vechi îl primesc la primul acces
+    pid = session.get(id_key)
+    if pid is None and session.get(name_key):
+        pid = lookup(session[name_key])
+        if pid is not None:
+            session[id_key] = pid
+    return pid
+
+
+def current_customer_id():
+    return session_principal('user', 'user_id', database.get_customer_id)
+
+
+def current_employee_id():
+    return session_principal('employee', 'employee_id', database.get_employee_id)
+
+
+def current_partner_id():
+    return session_principal('partner', 'partner_id', database.get_partner_id)
+
+
+def check_login(verify, username, password):
+    # (id, eroare, status HTTP) pentru formularele de login
+    try:
+        pid = verify(username, password)
+    except LoginThrottled as e:
+        return None, str(e), 429
+    except PasswordPoolBusy as e:
+        return None, str(e), 503
+    return (pid, None, 200) if pid else (None, 'Date invalide', 200)
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(
+        ['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+
+def wants_stream():
+    # Modul streaming: ?stream=1 sau Accept: application/x-ndjson
+    return request.args.get('stream') == '1' or wants_ndjson()
+
+
+def streamed_json(rows, transform=None):
+    # Răspuns chunked dintr-un generator de rânduri: listă JSON sau NDJSON
+    # (un obiect pe linie), după Accept. Conexiunea se eliberează abia după
+    # ultimul rând, prin teardown-ul păstrat de stream_with_context.
+    ndjson = wants_ndjson()
+    dumps = app.json.dumps
+
+    def generate():
+        buf = []
+        first = True
+        if not ndjson:
+            yield '['
+        for row in rows:
+            if transform is not None:
+                transform(row)
+            if ndjson:
+                buf.append(dumps(row) + '\n')
+            else:
+                buf.append(('' if first else ',') + dumps(row))
+                first = False
+            if len(buf) >= STREAM_CHUNK_ROWS:
+                yield ''.join(buf)
+                buf = []
+        if buf:
+            yield ''.join(buf)
+        if not ndjson:
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return app.response_class(stream_with_context(generate()), mimetype=mimetype)
+
+
+def add_date_fmt(row):
+    row['date_fmt'] = row['data'].strftime('%Y-%m-%d %H:%M')
 
 
 @app.route('/')
@@ -30,11 +201,17 @@ def profile():
 def orders():
     if 'user' not in session:
         return redirect(url_for('login'))
-    cid = database.get_customer_id(session['user'])
-    raw = database.get_orders_by_customer(cid)
-    for o in raw:
-        o['qty'] = database.get_order_quantity(o['id_order'])
-    return render_template('orders.html', orders=raw)
+    try:
+        limit, after = page_args(ORDERS_PAGE_SIZE)
+    except ValueError:
+        return redirect(url_for('orders'))
+    cid = current_customer_id()
+    raw = database.get_orders_with_totals_by_customer(cid, limit, after)
+    next_cursor = None
+    if len(raw) == limit:
+        next_cursor = encode_cursor(raw[-1]['data'], raw[-1]['id_order'])
+    return render_template('orders.html', orders=raw, next_cursor=next_cursor,
+                           first_page=after is None)
 
 
 @app.route('/employees')
@@ -69,7 +246,7 @@ def employees_achizitii_orders():
 def achizitii_order_detail(order_id: int):
     if session.get('employee_dept') != 'achizitii':
         return redirect(url_for('employee_login'))
-    eid = database.get_employee_id(session['employee'])
+    eid = current_employee_id()
     order = database.get_partner_order(order_id, eid)
     if not order:
         return "Order not found or not assigned to you", 404
@@ -90,26 +267,17 @@ def employees_vanzari():
 def employee_order_detail(order_id: int):
     if session.get('employee_dept') != 'sales':
         return redirect(url_for('employee_login'))
-    emp_user = session['employee']
+    emp_id = current_employee_id()
     if request.method == 'POST':
-        new_status = request.form.get('status')
-        database.update_order_status(emp_user, order_id, new_status)
-    emp_id = database.get_employee_id(emp_user)
-    order = None
-    for o in database.get_orders_by_employee(emp_id):
-        if o['id_order'] == order_id:
-            order = o
-            break
+        database.update_order_status(emp_id, order_id, request.form.get('status'))
+    order = database.get_order_detail(order_id, emp_id)
     if not order:
         return "Order not found or not assigned to you", 404
-    items = database.get_order_items(order_id)
-    order['qty'] = sum(i['quantity'] for i in items)
-    customer = database.get_customer_by_id(order['id_client'])
     return render_template(
         'employees_vanzari_order.html',
         order=order,
-        items=items,
-        customer=customer,
+        items=order['items'],
+        customer=order['customer'],
         statuses=STATUSES
     )
 
@@ -123,18 +291,15 @@ def employees_productie():
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    error = None
+    error, status = None, 200
     if request.method == 'POST':
         uname = request.form['username'].strip().lower()
-        pwd = request.form['password']
-        if database.verify_customer(uname, pwd):
+        pid, error, status = check_login(database.verify_customer, uname, request.form['password'])
+        if pid:
             session.clear()
-            session['user'] = uname
-            session.pop('employee', None)
-            session.pop('employee_dept', None)
+            session.update({'user': uname, 'user_id': pid, 'role': 'customer'})
             return redirect(url_for('products_page'))
-        error = 'Date invalide'
-    return render_template('login.html', error=error)
+    return render_template('login.html', error=error), status
 
 
 @app.route('/signup', methods=['GET', 'POST'])
@@ -143,13 +308,17 @@ def signup():
     if request.method == 'POST':
         data = request.form
         username = data['username'].strip().lower()
-        res = database.create_customer(
-            data['name'], data['surname'], username, data['password'],
-            data['email'], data.get('address', ''), data.get('phone', '')
-        )
+        try:
+            res = database.create_customer(
+                data['name'], data['surname'], username, data['password'],
+                data['email'], data.get('address', ''), data.get('phone', '')
+            )
+        except PasswordPoolBusy as e:
+            return render_template('signup.html', error=str(e)), 503
         if res.get('success'):
-            session.clear();
-            session['user'] = username
+            session.clear()
+            session.update({'user': username, 'user_id': database.get_customer_id(username),
+                            'role': 'customer'})
             return redirect(url_for('products_page'))
         error = res.get('error')
     return render_template('signup.html', error=error)
@@ -157,32 +326,30 @@ def signup():
 
 @app.route('/employee_login', methods=['GET', 'POST'])
 def employee_login():
-    error = None
+    error, status = None, 200
     if request.method == 'POST':
         uname = request.form['username'].strip().lower()
-        pwd = request.form['password']
-        if database.verify_employee(uname, pwd):
+        eid, error, status = check_login(database.verify_employee, uname, request.form['password'])
+        if eid:
             session.clear()
             emp = database.get_employee_by_username(uname)
-            session.update({'employee': uname, 'employee_dept': emp['department']})
-            session.pop('user', None)
+            session.update({'employee': uname, 'employee_id': eid,
+                            'employee_dept': emp['department'], 'role': 'employee'})
             return redirect(url_for('employees'))
-        error = 'Date invalide'
-    return render_template('employee_login.html', error=error)
+    return render_template('employee_login.html', error=error), status
 
 
 @app.route('/partner_login', methods=['GET', 'POST'])
 def partner_login():
-    error = None
+    error, status = None, 200
     if request.method == 'POST':
         uname = request.form['username'].strip().lower()
-        pwd = request.form['password']
-        if database.verify_partner(uname, pwd):
+        pid, error, status = check_login(database.verify_partner, uname, request.form['password'])
+        if pid:
             session.clear()
-            session['partner'] = uname
+            session.update({'partner': uname, 'partner_id': pid, 'role': 'partner'})
             return redirect(url_for('partners_page'))
-        error = 'Date invalide'
-    return render_template('partner_login.html', error=error)
+    return render_template('partner_login.html', error=error), status
 
 
 @app.route('/logout')
@@ -193,15 +360,50 @@ def logout():
 
 @app.route('/api/products')
 def api_products():
-    prods = database.get_stock()
-    return (jsonify(prods), 200) if prods else (jsonify({'error': 'No products'}), 404)
+    return cached_json('stock:final', database.get_stock)
+
+
+@app.route('/api/products/search')
+def api_products_search():
+    # ?q=&mode=prefix|substring|fuzzy&type=&limit=&offset=, cele mai relevante primele
+    q = request.args.get('q', '').strip()
+    mode = request.args.get('mode', 'fuzzy')
+    limit = request.args.get('limit', 20, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if not 1 <= len(q) <= 100:
+        return jsonify({'error': 'q trebuie să aibă între 1 și 100 de caractere'}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f"mode trebuie să fie unul din {', '.join(SEARCH_MODES)}"}), 400
+    if not 1 <= limit <= 100 or offset < 0:
+        return jsonify({'error': 'limit trebuie între 1 și 100, offset >= 0'}), 400
+    return jsonify(product_search.search(q, request.args.get('type') or None, mode, limit, offset))
 
 
 @app.route('/api/stock')
 def api_stock():
     final_only = request.args.get('final_only', '1') != '0'
-    rows = database.get_stock(final_only=final_only)
-    return (jsonify(rows), 200) if rows else (jsonify({'error': 'No products'}), 404)
+    if wants_stream():
+        # Fără cache: rândurile merg direct din cursorul server-side în răspuns
+        return streamed_json(database.get_stock(final_only=final_only, stream=True))
+    key = 'stock:final' if final_only else 'stock:all'
+    return cached_json(key, lambda: database.get_stock(final_only=final_only))
+
+
+@app.route('/metrics')
+def metrics():
+    # Histogramele de latență ale Database, în format text Prometheus
+    if database.instrumentation is None:
+        return 'metrics disabled (DB_METRICS=0)\n', 404
+    return app.response_class(database.instrumentation.render(),
+                              mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/stock/contention')
+def api_stock_contention():
+    # Contoare de contenție pe produs (rezervări, lipsă stoc, reîncercări, așteptare lock)
+    if 'employee' not in session:
+        return jsonify({'error': 'Not authorized'}), 403
+    return jsonify(database.get_stock_contention())
 
 
 @app.route('/api/achizitii/stock')
@@ -216,12 +418,40 @@ def api_achizitii_stock():
     return jsonify(raws)
 
 
+@app.route('/api/achizitii/offers')
+def api_achizitii_offers():
+    # Cele mai bune oferte (?top=1..3) pentru fiecare produs
+    if session.get('employee_dept') != 'achizitii':
+        return jsonify({'error': 'Not authorized'}), 403
+    top_k = min(max(request.args.get('top', 1, type=int), 1), 3)
+    return jsonify(database.get_best_partner_offers(top_k=top_k))
+
+
+@app.route('/api/mrp/run', methods=['POST'])
+def api_mrp_run():
+    # Plan de necesar: {"demand": [[id_product, cantitate], ...]} -> producție + achiziții
+    if session.get('employee_dept') not in ('achizitii', 'productie'):
+        return jsonify({'error': 'Not authorized'}), 403
+    demand = {}
+    try:
+        for pid, qty in (request.get_json() or {}).get('demand', []):
+            demand[int(pid)] = demand.get(int(pid), 0) + int(qty)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Cerere invalidă'}), 400
+    if not demand:
+        return jsonify({'error': 'Cererea este goală'}), 400
+    try:
+        return jsonify(run_mrp(database, demand))
+    except BOMCycleError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @app.route('/api/achizitii/place_order', methods=['POST'])
 def api_achizitii_place_order():
     if session.get('employee_dept') != 'achizitii':
         return jsonify({'error': 'Not authorized'}), 403
     items = (request.get_json() or {}).get('items', [])
-    emp_id = database.get_employee_id(session['employee'])
+    emp_id = current_employee_id()
     res = database.create_procurement_orders(emp_id, items)
     return (jsonify(res), 200 if res.get('success') else 400)
 
@@ -230,16 +460,16 @@ def api_achizitii_place_order():
 def api_achizitii_my_orders():
     if session.get('employee_dept') != 'achizitii':
         return jsonify({'error': 'Not authorized'}), 403
-    eid = database.get_employee_id(session['employee'])
-    rows = database.get_partner_orders()
-    out = []
+    try:
+        limit, after = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    status = [st for st in request.args.get('status', '').split(',') if st]
+    eid = current_employee_id()
+    rows = database.get_partner_orders_by_employee(eid, status, limit, after)
     for o in rows:
-        if o['id_employee'] != eid:
-            continue
         o['date_fmt'] = o['data'].strftime('%Y-%m-%d %H:%M')
-        o['partner'] = database.get_partner_name(o['id_partner'])
-        out.append(o)
-    return jsonify(out)
+    return paged_response(rows, limit, 'data', 'id_order')
 
 
 @app.route('/api/place_order', methods=['POST'])
@@ -247,7 +477,7 @@ def api_place_order():
     if 'user' not in session:
         return jsonify({'error': 'Not authenticated'}), 403
     items = (request.get_json() or {}).get('items', [])
-    res = database.place_order(database.get_customer_id(session['user']), items)
+    res = database.place_order(current_customer_id(), items)
     return (jsonify(res), 200 if res.get('success') else 400)
 
 
@@ -255,7 +485,7 @@ def api_place_order():
 def partners_page():
     if 'partner' not in session:
         return redirect(url_for('partner_login'))
-    partner_id = database.get_partner_id(session['partner'])
+    partner_id = current_partner_id()
     if not partner_id:
         return "Partener inexistent", 404
     return render_template('partners.html', partner_id=partner_id)
@@ -263,6 +493,8 @@ def partners_page():
 
 @app.route('/api/partners')
 def api_partners():
+    if wants_stream():
+        return streamed_json(database.get_partners(stream=True))
     partners = database.get_partners()
     return (jsonify(partners), 200) if partners else (jsonify({'error': 'No partners'}), 404)
 
@@ -290,8 +522,7 @@ def api_partner_products(partner_id):
 
 @app.route('/api/partners/<int:partner_id>/products', methods=['POST'])
 def api_set_partner_products(partner_id):
-    partner = database.get_partner(partner_id)
-    if not partner or session.get('partner', '').lower() != partner['username'].lower():
+    if current_partner_id() != partner_id:
         return jsonify({'error': 'Not authorized'}), 403
     prices = (request.get_json() or {}).get('prices', [])
     res = database.update_partner_prices(partner_id, prices)
@@ -302,12 +533,32 @@ def api_set_partner_products(partner_id):
 def api_employee_orders():
     if session.get('employee_dept') != 'sales':
         return jsonify({'error': 'Not authorized'}), 403
-    eid = database.get_employee_id(session['employee'])
-    data = database.get_orders_by_employee(eid)
+    stream = wants_stream()
+    try:
+        # exportul streaming rămâne complet; lista JSON are o pagină implicită
+        limit, after = page_args(None if stream else ORDERS_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    eid = current_employee_id()
+    if stream:
+        # limit/after se aplică și aici, dar fără X-Next-Cursor (header-ele pleacă primele)
+        rows = database.get_orders_with_totals_by_employee(eid, limit, after, stream=True)
+        return streamed_json(rows, add_date_fmt)
+    data = database.get_orders_with_totals_by_employee(eid, limit, after)
     for o in data:
-        o['qty'] = database.get_order_quantity(o['id_order'])
-        o['date_fmt'] = o['data'].strftime('%Y-%m-%d %H:%M')
-    return jsonify(data)
+        add_date_fmt(o)
+    return paged_response(data, limit, 'data', 'id_order')
+
+
+@app.route('/api/employee/orders/<int:order_id>')
+def api_employee_order_detail(order_id):
+    if session.get('employee_dept') != 'sales':
+        return jsonify({'error': 'Not authorized'}), 403
+    order = database.get_order_detail(order_id, current_employee_id())
+    if not order:
+        return jsonify({'error': 'Order not found or not assigned to you'}), 404
+    add_date_fmt(order)
+    return jsonify(order)
 
 
 @app.route('/api/employee/update_order', methods=['POST'])
@@ -315,7 +566,8 @@ def api_employee_update_order():
     if session.get('employee_dept') != 'sales':
         return jsonify({'error': 'Not authorized'}), 403
     payload = request.get_json() or {}
-    res = database.update_order_status(session['employee'], payload.get('order_id'), payload.get('status'))
+    eid = current_employee_id()
+    res = database.update_order_status(eid, payload.get('order_id'), payload.get('status'))
     return (jsonify(res), 200 if res.get('success') else 400)
 
 
@@ -323,30 +575,18 @@ def api_employee_update_order():
 def get_recipes():
     if session.get('employee_dept') != 'productie':
         return jsonify({'error': 'Not authorized'}), 403
-    recipes = database.get_recipes()
-    stock_rows = database.get_stock(final_only=False)
-    stock_map = {row['id_product']: row for row in stock_rows}
-    result = []
-    for rec in recipes:
-        ingredients = []
-        for i in range(1, 6):
-            mid = rec.get(f'id_material{i}')
-            qty = rec.get(f'quantity_material{i}')
-            if mid and qty:
-                srow = stock_map.get(mid, {})
-                ingredients.append({
-                    'name': srow.get('name', f'ID {mid}'),
-                    'quantity': qty,
-                    'stock': srow.get('quantity', 0)
-                })
-        final = stock_map.get(rec['id_final'], {})
-        result.append({
-            'id_final': rec['id_final'],
-            'final_name': final.get('name', f'ID {rec["id_final"]}'),
-            'final_stock': final.get('quantity', 0),
-            'ingredients': ingredients
-        })
-    return jsonify(result)
+    return jsonify(database.get_recipes())
+
+
+@app.route('/api/employee/productie/feasibility')
+def recipe_feasibility():
+    if session.get('employee_dept') != 'productie':
+        return jsonify({'error': 'Not authorized'}), 403
+    batches = request.args.get('quantity', 1, type=int)
+    if batches < 1:
+        return jsonify({'error': 'Invalid quantity'}), 400
+    recipe_id = request.args.get('recipe_id', type=int)
+    return jsonify(database.get_recipe_feasibility(batches, recipe_id))
 
 
 @app.route('/api/employee/productie/recipes', methods=['POST'])
@@ -367,10 +607,29 @@ def produce_product():
     if session.get('employee_dept') != 'productie':
         return jsonify({'error': 'Not authorized'}), 403
     data = request.get_json() or {}
-    recipe_id = data.get("recipe_id")
-    quantity = data.get("quantity")
-    res = database.produce_product(recipe_id, quantity)
-    return (jsonify(res), 200 if res.get('success') else 400)
+    try:
+        recipe_id = int(data.get("recipe_id"))
+        quantity = int(data.get("quantity"))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'recipe_id și quantity trebuie numere întregi'}), 400
+    if quantity <= 0:
+        return jsonify({'error': 'Invalid quantity'}), 400
+    emp_id = current_employee_id()
+    res = database.enqueue_production_job(recipe_id, quantity, emp_id)
+    if not res.get('success'):
+        return jsonify(res), 400
+    production_worker.wake()
+    return jsonify(res), 202
+
+
+@app.route('/api/employee/productie/jobs/<int:job_id>')
+def production_job_status(job_id):
+    if session.get('employee_dept') != 'productie':
+        return jsonify({'error': 'Not authorized'}), 403
+    job = database.get_production_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job inexistent'}), 404
+    return jsonify(job)
 
 
 @app.route('/admin')
@@ -378,6 +637,30 @@ def admin_panel():
     return render_template('admin.html')
 
 
+@app.route('/admin/performance')
+def admin_performance():
+    # p50/p95/p99 pe rută din request-urile profilate (X-Profile: 1 sau PROFILE_SAMPLE_RATE)
+    if not session.get('employee_dept'):
+        return 'Not authorized', 403
+    return render_template('admin_performance.html', routes=profiler.summary(),
+                           sample_rate=profiler.sample_rate)
+
+
+@app.route('/api/admin/performance')
+def api_admin_performance():
+    if not session.get('employee_dept'):
+        return jsonify({'error': 'Not authorized'}), 403
+    return jsonify(profiler.summary())
+
+
+@app.route('/api/admin/performance/reset', methods=['POST'])
+def api_admin_performance_reset():
+    if not session.get('employee_dept'):
+        return jsonify({'error': 'Not authorized'}), 403
+    profiler.reset()
+    return jsonify({'success': True})
+
+
 @app.route('/api/products', methods=['POST'])
 def api_create_product():
     data = request.get_json(silent=True) or request.form
@@ -395,16 +678,73 @@ def api_create_product():
             (name, price, description, quantity, ptype)
         )
         database.connection.commit()
+        database.notify_stock_change(catalog=True)
         return jsonify({'success': True}), 201
     except Exception as e:
         database.connection.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+def report_response(name, id=None):
+    # Rulează un raport din analytics cu ?from=&to= (YYYY-MM-DD) și ?limit=
+    if 'employee' not in session:
+        return jsonify({'error': 'Not authorized'}), 403
+    try:
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'error': 'Datele trebuie în formatul YYYY-MM-DD'}), 400
+    limit = request.args.get('limit', 50, type=int)
+    if not 1 <= limit <= 1000:
+        return jsonify({'error': 'limit trebuie între 1 și 1000'}), 400
+    rows = analytics.report(database, name, start, end, limit, id)
+    for row in rows:
+        if 'day' in row:
+            row['day'] = row['day'].isoformat()
+    return jsonify(rows)
+
+
+@app.route('/api/reports/<any(daily, products, customers, employees):name>')
+def api_report(name):
+    return report_response(name)
+
+
+@app.route('/api/reports/products/<int:product_id>/daily')
+def api_report_product_daily(product_id):
+    return report_response('product_daily', product_id)
+
+
+@app.route('/api/bulk/<entity>.csv')
+def api_bulk_export(entity):
+    if entity not in bulk.EXPORTS:
+        return jsonify({'error': 'Entitate necunoscută'}), 404
+    if session.get('employee_dept') not in BULK_DEPARTMENTS[entity]:
+        return jsonify({'error': 'Not authorized'}), 403
+    out = io.StringIO()
+    bulk.export_csv(database, entity, out)
+    return app.response_class(
+        out.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={entity}.csv'}
+    )
+
+
+@app.route('/api/bulk/<entity>', methods=['POST'])
+def api_bulk_import(entity):
+    # CSV-ul vine fie ca fișier în câmpul "file", fie direct în corpul cererii
+    if entity not in bulk.COLUMNS:
+        return jsonify({'error': 'Entitate necunoscută'}), 404
+    if session.get('employee_dept') not in BULK_DEPARTMENTS[entity]:
+        return jsonify({'error': 'Not authorized'}), 403
+    upload = request.files.get('file')
+    source = upload.stream if upload else request.stream
+    res = bulk.import_csv(database, entity, source)
+    return (jsonify(res), 200 if res.get('success') else 400)
+
+
 @app.route('/api/employees', methods=['POST'])
 def api_create_employee():
     data = request.get_json(silent=True) or request.form
-    print("Employee data received:", data)
     try:
         salary = float(data.get('salary', '').strip())
     except Exception:
@@ -420,6 +760,11 @@ def api_create_employee():
     if not all([name, surname, username, email, password,
                 department, phone_number, address, salary]):
         return jsonify({'error': 'Toate câmpurile sunt obligatorii'}), 400
+    # Hash-ul se calculează înaintea tranzacției; pool-ul plin înseamnă 503, ca la login
+    try:
+        hashed = database.passwords.hash(password)
+    except PasswordPoolBusy as e:
+        return jsonify({'error': str(e)}), 503
     try:
         database.cursor.execute(
             """
@@ -431,9 +776,10 @@ def api_create_employee():
             """,
             (name, surname, department, salary,
              email, phone_number, address,
-             username, password)
+             username, hashed)
         )
         database.connection.commit()
+        database.identities.invalidate('employee', username)
         return jsonify({'success': True}), 201
     except Exception as e:
         traceback.print_exc()
@@ -453,12 +799,17 @@ def api_create_customer():
     phone_number = data.get('phone_number', '')
     if not all([name, surname, username, email, password]):
         return jsonify({'error': 'Toate campurile sunt obligatorii'}), 400
+    try:
+        hashed = database.passwords.hash(password)
+    except PasswordPoolBusy as e:
+        return jsonify({'error': str(e)}), 503
     try:
         database.cursor.execute(
             "INSERT INTO customers (name, surname, username, email, password, address, phone_number) VALUES (%s,%s,%s,%s,%s,%s,%s)",
-            (name, surname, username, email, password, address, phone_number)
+            (name, surname, username, email, hashed, address, phone_number)
         )
         database.connection.commit()
+        database.identities.invalidate('customer', username)
         return jsonify({'success': True}), 201
     except Exception as e:
         database.connection.rollback()
@@ -476,12 +827,19 @@ def api_create_partner():
     email = data.get('email', '')
     if not name:
         return jsonify({'error': 'Nume partener obligatoriu'}), 400
+    try:
+        hashed = database.passwords.hash(password) if password else password
+    except PasswordPoolBusy as e:
+        return jsonify({'error': str(e)}), 503
     try:
         database.cursor.execute(
             "INSERT INTO partners (name, username, password, address, phone_number, email) VALUES (%s,%s,%s,%s,%s,%s)",
-            (name, username, password, address, phone_number, email)
+            (name, username, hashed,
+             address, phone_number, email)
         )
         database.connection.commit()
+        if username:
+            database.identities.invalidate('partner', username)
         return jsonify({'success': True}), 201
     except Exception as e:
         database.connection.rollback()
@@ -496,41 +854,36 @@ def api_create_recipe():
         final_qty = int(data.get('quantity'))
     except (TypeError, ValueError):
         return jsonify({'error': 'id_final și quantity trebuie numere întregi'}), 400
+    # Ingredientele vin fie ca listă JSON, fie ca perechi id_materialN / quantity_materialN
+    raw = data.get('ingredients')
+    if raw is None:
+        nums = sorted(int(k[len('id_material'):]) for k in data.keys()
+                      if k.startswith('id_material') and k[len('id_material'):].isdigit())
+        raw = [{'id_material': data.get(f'id_material{n}'),
+                'quantity': data.get(f'quantity_material{n}')} for n in nums]
+    if not isinstance(raw, list):
+        return jsonify({'error': 'ingredients trebuie să fie o listă'}), 400
     materials = []
-    for i in range(1, 6):
-        mat = data.get(f'id_material{i}')
-        qty = data.get(f'quantity_material{i}')
-        if mat and qty:
-            try:
-                materials.append((int(mat), int(qty)))
-            except ValueError:
-                return jsonify({'error': f'Ingredient {i} invalid'}), 400
-        else:
-            materials.append((None, None))
-    cols = ['id_final', 'quantity']
-    vals = [id_final, final_qty]
-    for idx, (mid, mqty) in enumerate(materials, start=1):
-        cols.append(f'id_material{idx}')
-        cols.append(f'quantity_material{idx}')
-        vals.append(mid)
-        vals.append(mqty)
-    placeholders = ','.join(['%s'] * len(vals))
-    col_sql = ','.join(cols)
-    sql = f"INSERT INTO recipes ({col_sql}) VALUES ({placeholders})"
-    try:
-        database.cursor.execute(sql, tuple(vals))
-        database.connection.commit()
-        return jsonify({'success': True}), 201
-    except Exception as e:
-        database.connection.rollback()
-        return jsonify({'error': str(e)}), 500
+    for i, item in enumerate(raw, start=1):
+        if not isinstance(item, dict):
+            return jsonify({'error': f'Ingredient {i} invalid'}), 400
+        if not item.get('id_material') and not item.get('quantity'):
+            continue
+        try:
+            materials.append((int(item.get('id_material')), int(item.get('quantity'))))
+        except (TypeError, ValueError):
+            return jsonify({'error': f'Ingredient {i} invalid'}), 400
+    if not materials:
+        return jsonify({'error': 'Rețeta trebuie să aibă cel puțin un ingredient'}), 400
+    res = database.create_recipe(id_final, final_qty, materials)
+    return (jsonify(res), 201) if res.get('success') else (jsonify(res), 500)
 
 
 @app.route('/partners/orders')
 def partner_orders_page():
     if 'partner' not in session:
         return redirect(url_for('partner_login'))
-    partner_id = database.get_partner_id(session['partner'])
+    partner_id = current_partner_id()
     if not partner_id:
         return "Partener inexistent", 404
     return render_template('partner_orders.html', partner_id=partner_id)
@@ -540,10 +893,12 @@ def partner_orders_page():
 def api_partner_my_orders():
     if 'partner' not in session:
         return jsonify({'error': 'Not authorized'}), 403
-    pid = database.get_partner_id(session['partner'])
+    pid = current_partner_id()
+    if wants_stream():
+        return streamed_json(database.get_partner_orders_by_partner(pid, stream=True), add_date_fmt)
     data = database.get_partner_orders_by_partner(pid)
     for r in data:
-        r['date_fmt'] = r['data'].strftime('%Y-%m-%d %H:%M')
+        add_date_fmt(r)
     return jsonify(data)
 
 
@@ -552,7 +907,7 @@ def api_partner_update_order():
     if 'partner' not in session:
         return jsonify({'error': 'Not authorized'}), 403
     payload = request.get_json() or {}
-    pid = database.get_partner_id(session['partner'])
+    pid = current_partner_id()
     res = database.update_partner_order_status(
         pid,
         payload.get('order_id'),
@@ -0,0 +1,39 @@
+import statistics
+import time
+
+import psycopg2.extras
+
+
+def seed_bench_products(db, count, quantity=10 ** 9):
+    # Creează (o singură dată) produse "Bench SKU n" cu stoc mare și întoarce id-urile lor
+    rows = [(f"Bench SKU {i}", 1.00, "Produs benchmark", quantity, "final")
+            for i in range(count)]
+    with db.connection:
+        psycopg2.extras.execute_values(
+            db.cursor,
+            "INSERT INTO stock (name,price,description,quantity,type) VALUES %s "
+            "ON CONFLICT (name) DO UPDATE SET quantity = EXCLUDED.quantity",
+            rows
+        )
+        db.cursor.execute(
+            "SELECT id_product FROM stock WHERE name LIKE 'Bench SKU %%' "
+            "ORDER BY id_product LIMIT %s", (count,))
+        return [r["id_product"] for r in db.cursor.fetchall()]
+
+
+def first_customer(db):
+    db.cursor.execute("SELECT id_customer FROM customers ORDER BY id_customer LIMIT 1")
+    row = db.cursor.fetchone()
+    db.connection.rollback()
+    return row["id_customer"] if row else None
+
+
+def timed(fn, repeat):
+    # Rulează fn de `repeat` ori; întoarce (median, p95) în milisecunde
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
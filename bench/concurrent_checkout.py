@@ -0,0 +1,87 @@
+"""Test de încărcare: multe fire apelează place_order pe același produs.
+
+Rulare: python -m bench.concurrent_checkout [fire] [stoc]   (implicit 16 500)
+Verifică la final că nu s-a vândut mai mult decât stocul inițial.
+"""
+import random
+import sys
+import threading
+
+from bench.common import first_customer
+from db import Database
+
+HOT_SKU = "Bench Hot SKU"
+
+
+def main(threads, initial_stock):
+    db = Database()
+    with db.connection:
+        db.cursor.execute(
+            "INSERT INTO stock (name,price,description,quantity,type) "
+            "VALUES (%s,1.00,'Produs benchmark',%s,'final') "
+            "ON CONFLICT (name) DO UPDATE SET quantity = EXCLUDED.quantity "
+            "RETURNING id_product",
+            (HOT_SKU, initial_stock))
+        pid = db.cursor.fetchone()["id_product"]
+        db.cursor.execute(
+            "SELECT COALESCE(SUM(quantity), 0) AS sold FROM order_content WHERE id_product=%s",
+            (pid,))
+        sold_before = db.cursor.fetchone()["sold"]
+    customer_id = first_customer(db)
+    db.release()
+
+    sold = []
+    errors = []
+    lock = threading.Lock()
+
+    def buyer():
+        mine = 0
+        try:
+            while True:
+                qty = random.randint(1, 3)
+                res = db.place_order(customer_id, [(pid, qty)])
+                if res.get("success"):
+                    mine += qty
+                elif "insuficient" in res["error"].lower():
+                    if qty == 1:
+                        break
+                else:
+                    with lock:
+                        errors.append(res["error"])
+                    break
+        finally:
+            db.release()
+            with lock:
+                sold.append(mine)
+
+    workers = [threading.Thread(target=buyer) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    with db.connection:
+        db.cursor.execute("SELECT quantity FROM stock WHERE id_product=%s", (pid,))
+        remaining = db.cursor.fetchone()["quantity"]
+        db.cursor.execute(
+            "SELECT COALESCE(SUM(quantity), 0) AS sold FROM order_content WHERE id_product=%s",
+            (pid,))
+        recorded = db.cursor.fetchone()["sold"] - sold_before
+    stats = [r for r in db.get_stock_contention() if r["id_product"] == pid]
+    db.close()
+
+    total = sum(sold)
+    print(f"threads={threads} stock={initial_stock} sold={total} "
+          f"recorded={recorded} remaining={remaining} errors={len(errors)}")
+    if stats:
+        print("contention:", stats[0])
+    ok = (total == recorded == initial_stock - remaining and remaining >= 0 and not errors)
+    if not ok:
+        print("FAIL: oversell or lost update detected", errors[:5])
+        sys.exit(1)
+    print("OK: no oversell")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if args else 16, args[1] if len(args) > 1 else 500)
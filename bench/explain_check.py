@@ -0,0 +1,180 @@
+"""Verificare EXPLAIN: metodele de căutare ale Database nu au voie să facă Seq Scan.
+
+Rulare (pe o bază de date de test!): python -m bench.explain_check [scala]
+Populează tabelele cu date multe (o singură dată), apelează fiecare metodă de
+căutare, înregistrează SQL-ul executat și îi rulează EXPLAIN. Iese cu cod 1
+dacă vreun plan conține un Seq Scan pe un tabel mare.
+"""
+import json
+import sys
+
+import psycopg2.extras
+
+from db import Database
+
+# Tabelele populate masiv; un Seq Scan pe ele înseamnă un index lipsă
+LARGE_TABLES = {
+    "customers", "employees", "partners", "orders", "order_content",
+    "partner_products", "partner_orders", "partner_order_content",
+}
+
+
+class RecordingCursor(psycopg2.extras.RealDictCursor):
+    # Cursor care ține minte fiecare interogare executată
+    recorded = None
+
+    def execute(self, query, vars=None):
+        if RecordingCursor.recorded is not None:
+            RecordingCursor.recorded.append(self.mogrify(query, vars).decode())
+        return super().execute(query, vars)
+
+
+class RecordingDatabase(Database):
+    @property
+    def cursor(self):
+        cur = getattr(self._local, "cursor", None)
+        if cur is None or cur.closed:
+            cur = self.connection.cursor(cursor_factory=RecordingCursor)
+            self._local.cursor = cur
+        return cur
+
+    def _dict_cur(self):
+        return self.connection.cursor(cursor_factory=RecordingCursor)
+
+
+def seed(db, scale):
+    # Date sintetice generate direct în SQL; se sare peste dacă există deja.
+    # GREATEST(...): și la scale mici (< 100) există cel puțin un partener și
+    # câte un angajat sales / achizitii, iar modulo nu împarte la zero.
+    db.cursor.execute("SELECT COUNT(*) AS cnt FROM customers WHERE username LIKE 'bench\\_cust\\_%'")
+    if db.cursor.fetchone()["cnt"]:
+        db.connection.rollback()
+        return
+    n = scale
+    with db.connection:
+        db.cursor.execute("""
+            INSERT INTO stock (name,price,description,quantity,type)
+            VALUES ('Bench seed SKU', 1.00, 'Produs benchmark', 2000000000, 'final')
+            ON CONFLICT (name) DO UPDATE SET quantity = 2000000000;
+            INSERT INTO customers (name,surname,username,password,email)
+            SELECT 'C', 'B', 'bench_cust_' || g, 'x', 'c' || g || '@bench'
+            FROM generate_series(1, %(n)s) g;
+            INSERT INTO employees (name,surname,department,salary,email,phone_number,address,username,password)
+            SELECT 'E', 'B', CASE WHEN g %% 2 = 0 THEN 'sales' ELSE 'achizitii' END, 1000,
+                   'e' || g || '@bench', '-', '-', 'bench_emp_' || g, 'x'
+            FROM generate_series(1, GREATEST(%(n)s / 50, 2)) g;
+            INSERT INTO partners (name,username,password)
+            SELECT 'P' || g, 'bench_partner_' || g, 'x'
+            FROM generate_series(1, GREATEST(%(n)s / 50, 1)) g;
+            INSERT INTO partner_products (id_stock, price, quantity, id_partner)
+            SELECT s.id_product, 1 + random(), 1000000000, p.id_partner
+            FROM partners p CROSS JOIN stock s
+            WHERE p.username LIKE 'bench\\_partner\\_%%';
+            INSERT INTO orders (id_client, data, progress, id_employee)
+            SELECT c.id_customer, now() - (g || ' minutes')::interval, 'completed', e.id
+            FROM generate_series(1, %(n)s * 2) g
+            JOIN customers c ON c.username = 'bench_cust_' || (1 + g %% %(n)s)
+            JOIN employees e ON e.username = 'bench_emp_' || (2 + 2 * (g %% GREATEST(%(n)s / 100, 1)));
+            INSERT INTO order_content (id_order, id_product, quantity, price)
+            SELECT o.id_order, s.id_product, 1, 1.00
+            FROM orders o, stock s WHERE s.name = 'Bench seed SKU';
+            INSERT INTO partner_orders (id_partner, data, status, id_employee)
+            SELECT p.id_partner, now() - (g || ' minutes')::interval, 'completed', e.id
+            FROM generate_series(1, %(n)s) g
+            JOIN partners p  ON p.username = 'bench_partner_' || (1 + g %% GREATEST(%(n)s / 50, 1))
+            JOIN employees e ON e.username = 'bench_emp_' || (1 + 2 * (g %% GREATEST(%(n)s / 100, 1)));
+            INSERT INTO partner_order_content (id_product, id_order, quantity, price)
+            SELECT pp.id_product, po.id_order, 1, 1.00
+            FROM partner_orders po
+            JOIN LATERAL (SELECT id_product FROM partner_products
+                          WHERE id_partner = po.id_partner LIMIT 1) pp ON TRUE;
+        """, {"n": n})
+    db.connection.autocommit = True
+    db.cursor.execute("ANALYZE")
+    db.connection.autocommit = False
+
+
+def seq_scans(plan):
+    # Toate tabelele mari citite secvențial într-un plan EXPLAIN (FORMAT JSON)
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def sample_ids(db):
+    db.cursor.execute("""
+        SELECT (SELECT id_customer FROM customers WHERE username = 'bench_cust_7') AS cid,
+               (SELECT id FROM employees WHERE username = 'bench_emp_4')           AS sales_eid,
+               (SELECT id FROM employees WHERE username = 'bench_emp_3')           AS acq_eid,
+               (SELECT id_partner FROM partners WHERE username = 'bench_partner_5') AS pid
+    """)
+    ids = db.cursor.fetchone()
+    db.cursor.execute("SELECT id_order FROM orders WHERE id_client = %s LIMIT 1", (ids["cid"],))
+    ids["oid"] = db.cursor.fetchone()["id_order"]
+    db.cursor.execute("SELECT id_order FROM partner_orders WHERE id_partner = %s LIMIT 1", (ids["pid"],))
+    ids["poid"] = db.cursor.fetchone()["id_order"]
+    db.connection.rollback()
+    return ids
+
+
+def lookups(db, ids):
+    # Metodele care trebuie să folosească indecși, cu argumente din datele populate
+    return {
+        "get_customer_id": lambda: db.get_customer_id("BENCH_CUST_7"),
+        "get_employee_id": lambda: db.get_employee_id("Bench_Emp_4"),
+        "get_partner_id": lambda: db.get_partner_id("bench_partner_5"),
+        "verify_customer": lambda: db.verify_customer("bench_cust_7", "x"),
+        "verify_employee": lambda: db.verify_employee("bench_emp_4", "x"),
+        "verify_partner": lambda: db.verify_partner("bench_partner_5", "x"),
+        "get_customer_by_id": lambda: db.get_customer_by_id(ids["cid"]),
+        "get_customer_by_username": lambda: db.get_customer_by_username("bench_cust_7"),
+        "get_employee_by_username": lambda: db.get_employee_by_username("bench_emp_4"),
+        "get_orders_by_customer": lambda: db.get_orders_by_customer(ids["cid"]),
+        "get_orders_with_totals_by_customer": lambda: db.get_orders_with_totals_by_customer(ids["cid"], 50),
+        "get_orders_with_totals_by_employee": lambda: db.get_orders_with_totals_by_employee(ids["sales_eid"], 50),
+        "get_order_detail": lambda: db.get_order_detail(ids["oid"], ids["sales_eid"]),
+        "get_order_items": lambda: db.get_order_items(ids["oid"]),
+        "get_order_quantity": lambda: db.get_order_quantity(ids["oid"]),
+        "get_partner": lambda: db.get_partner(ids["pid"]),
+        "get_partner_products": lambda: db.get_partner_products(ids["pid"]),
+        "get_partner_order": lambda: db.get_partner_order(ids["poid"]),
+        "get_partner_orders_by_partner": lambda: db.get_partner_orders_by_partner(ids["pid"]),
+        "get_partner_orders_by_employee": lambda: db.get_partner_orders_by_employee(ids["acq_eid"], limit=50),
+        "get_partner_order_items": lambda: db.get_partner_order_items(ids["poid"]),
+        "get_partner_order_quantity": lambda: db.get_partner_order_quantity(ids["poid"]),
+    }
+
+
+def main(scale):
+    if scale < 1:
+        sys.exit("scala trebuie să fie cel puțin 1")
+    db = RecordingDatabase()
+    seed(db, scale)
+    ids = sample_ids(db)
+    failures = {}
+    for name, call in lookups(db, ids).items():
+        RecordingCursor.recorded = []
+        call()
+        queries, RecordingCursor.recorded = RecordingCursor.recorded, None
+        db.connection.rollback()
+        for sql in queries:
+            with db.connection.cursor() as cur:
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql)
+                plan = cur.fetchone()[0][0]["Plan"]
+            scans = seq_scans(plan)
+            if scans:
+                failures.setdefault(name, []).append((scans, sql))
+        db.connection.rollback()
+        print(f"{'FAIL' if name in failures else 'ok':>4}  {name}")
+    db.close()
+    for name, problems in failures.items():
+        for scans, sql in problems:
+            print(f"\n{name}: Seq Scan on {', '.join(scans)}\n  {json.dumps(sql)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
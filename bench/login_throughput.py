@@ -0,0 +1,85 @@
+"""Benchmark: login-uri concurente prin pool-ul de verificare a parolelor.
+
+Rulare: python -m bench.login_throughput [fire] [login-uri]   (implicit 32 2000)
+Creează (o singură dată) clienți bench_login_N cu parola hash-uită, apoi
+`fire` fire apelează verify_customer pe username-uri diferite. Raportează
+login-uri/s, latența p50/p95/p99 și câte încercări au fost refuzate de
+coada limitată (PasswordPoolBusy) sau de rate limit (LoginThrottled).
+"""
+import statistics
+import sys
+import threading
+import time
+
+import psycopg2.extras
+
+from db import Database
+from passwords import LoginThrottled, PasswordPoolBusy
+
+PASSWORD = "bench-password"
+USERS = 500
+
+
+def seed_users(db):
+    db.cursor.execute("SELECT COUNT(*) AS cnt FROM customers WHERE username LIKE 'bench\\_login\\_%'")
+    if db.cursor.fetchone()["cnt"] >= USERS:
+        db.connection.rollback()
+        return
+    hashed = db.passwords.hash(PASSWORD)
+    with db.connection:
+        psycopg2.extras.execute_values(
+            db.cursor,
+            "INSERT INTO customers (name,surname,username,password,email) VALUES %s "
+            "ON CONFLICT DO NOTHING",
+            [("B", "Login", f"bench_login_{i}", hashed, f"l{i}@bench") for i in range(USERS)])
+
+
+def main(threads, total):
+    db = Database()
+    seed_users(db)
+    db.release()
+
+    latencies = []
+    outcome = {"ok": 0, "failed": 0, "busy": 0, "throttled": 0}
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        try:
+            for n in counter:
+                start = time.perf_counter()
+                try:
+                    result = "ok" if db.verify_customer(f"bench_login_{n % USERS}", PASSWORD) else "failed"
+                except PasswordPoolBusy:
+                    result = "busy"
+                except LoginThrottled:
+                    result = "throttled"
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    outcome[result] += 1
+                    if result == "ok":
+                        latencies.append(elapsed)
+        finally:
+            db.release()
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = time.perf_counter() - start
+    db.close()
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    print(f"threads={threads} attempts={total} wall={wall:.2f}s "
+          f"logins/s={outcome['ok'] / wall:.1f} "
+          f"pool_workers={db.passwords.workers} max_pending={db.passwords.max_pending}")
+    print(f"latency ms: p50={q[49]:.1f} p95={q[94]:.1f} p99={q[98]:.1f}")
+    print("outcome:", outcome)
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    main(args[0] if args else 32, args[1] if len(args) > 1 else 2000)
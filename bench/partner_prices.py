@@ -0,0 +1,46 @@
+"""Actualizarea listei de prețuri a unui partener: bucla veche vs upsert set-based.
+
+Rulare: python -m bench.partner_prices [mărimi...]   (implicit 10 1000 50000)
+"""
+import random
+import sys
+
+from bench.common import seed_bench_products, timed
+from db import Database
+
+
+def legacy_update_prices(db, partner_id, price_list):
+    # Vechea implementare: UPDATE pe articol, apoi INSERT dacă nu exista rândul
+    with db.connection:
+        for item in price_list:
+            db.cursor.execute(
+                "UPDATE partner_products SET price=%s WHERE id_stock=%s AND id_partner=%s",
+                (item["price"], item["id_product"], partner_id))
+            if db.cursor.rowcount == 0:
+                db.cursor.execute(
+                    "INSERT INTO partner_products (id_stock, price, quantity, id_partner) "
+                    "VALUES (%s,%s,0,%s)",
+                    (item["id_product"], item["price"], partner_id))
+
+
+def main(sizes):
+    db = Database()
+    product_ids = seed_bench_products(db, max(sizes))
+    db.cursor.execute("SELECT id_partner FROM partners ORDER BY id_partner LIMIT 1")
+    partner_id = db.cursor.fetchone()["id_partner"]
+    db.connection.rollback()
+    print(f"{'items':>6} {'upsert p50':>11} {'loop p50':>10} {'speedup':>8}  (ms)")
+    for size in sizes:
+        repeat = 5 if size <= 1000 else 2
+
+        def price_list():
+            return [{"id_product": pid, "price": round(random.uniform(0.5, 5), 2)}
+                    for pid in product_ids[:size]]
+        bulk = timed(lambda: db.update_partner_prices(partner_id, price_list()), repeat)
+        loop = timed(lambda: legacy_update_prices(db, partner_id, price_list()), repeat)
+        print(f"{size:>6} {bulk[0]:>11.2f} {loop[0]:>10.2f} {loop[0] / bulk[0]:>7.1f}x")
+    db.close()
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10, 1000, 50000])
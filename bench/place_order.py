@@ -0,0 +1,47 @@
+"""Latența Database.place_order în funcție de mărimea coșului.
+
+Rulare: python -m bench.place_order [mărimi...]   (implicit 1 10 100 500)
+Compară calea set-based cu inserarea rând cu rând folosită anterior.
+"""
+import sys
+from datetime import datetime
+
+from bench.common import first_customer, seed_bench_products, timed
+from db import Database
+
+
+def legacy_place_order(db, customer_id, items):
+    # Vechea implementare: un SELECT de preț și un INSERT pentru fiecare articol
+    with db.connection:
+        db.cursor.execute(
+            "SELECT id FROM employees WHERE department='sales' ORDER BY id LIMIT 1")
+        emp_id = db.cursor.fetchone()["id"]
+        db.cursor.execute(
+            "INSERT INTO orders (id_client,data,progress,id_employee) "
+            "VALUES (%s,%s,'pending',%s) RETURNING id_order",
+            (customer_id, datetime.utcnow(), emp_id))
+        oid = db.cursor.fetchone()["id_order"]
+        for pid, qty in items:
+            db.cursor.execute("SELECT price FROM stock WHERE id_product=%s", (pid,))
+            price = db.cursor.fetchone()["price"]
+            db.cursor.execute(
+                "INSERT INTO order_content (id_order,id_product,quantity,price) "
+                "VALUES (%s,%s,%s,%s)", (oid, pid, qty, price))
+
+
+def main(sizes):
+    db = Database()
+    product_ids = seed_bench_products(db, max(sizes))
+    customer_id = first_customer(db)
+    repeat = 20
+    print(f"{'items':>6} {'bulk p50':>10} {'bulk p95':>10} {'rows p50':>10} {'rows p95':>10}  (ms)")
+    for size in sizes:
+        items = [(pid, 1) for pid in product_ids[:size]]
+        bulk = timed(lambda: db.place_order(customer_id, items), repeat)
+        rows = timed(lambda: legacy_place_order(db, customer_id, items), repeat)
+        print(f"{size:>6} {bulk[0]:>10.2f} {bulk[1]:>10.2f} {rows[0]:>10.2f} {rows[1]:>10.2f}")
+    db.close()
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1, 10, 100, 500])
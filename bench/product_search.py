@@ -0,0 +1,58 @@
+"""Benchmark: latența /api/products/search pe un catalog mare.
+
+Rulare (pe o bază de date de test!): python -m bench.product_search [produse]   (implicit 1000000)
+Populează stock cu produse sintetice (o singură dată) și măsoară mediana și
+p95 pentru fiecare mod de căutare, atât pe indexul pg_trgm (dacă există) cât
+și pe indexul n-gram din memorie.
+"""
+import sys
+import time
+
+from bench.common import timed
+from db import Database
+from search import MODES, ProductSearch
+
+QUERIES = ["bench", "catalog 4242", "catlog 99", "sku 12345"]
+
+
+def seed(db, count):
+    db.cursor.execute("SELECT COUNT(*) AS cnt FROM stock WHERE name LIKE 'Bench catalog %'")
+    have = db.cursor.fetchone()["cnt"]
+    with db.connection:
+        db.cursor.execute(
+            """
+            INSERT INTO stock (name, price, description, quantity, type)
+            SELECT 'Bench catalog ' || g || ' sku ' || (g * 7919 %% 100000), 1.00, '', 100,
+                   CASE WHEN g %% 5 = 0 THEN 'material' ELSE 'final' END
+            FROM generate_series(%s, %s) g
+            ON CONFLICT (name) DO NOTHING
+            """,
+            (have + 1, count))
+    db.connection.autocommit = True
+    db.cursor.execute("ANALYZE stock")
+    db.connection.autocommit = False
+
+
+def main(count):
+    db = Database()
+    seed(db, count)
+    # min_age infinit: backend-ul ales mai jos nu e reverificat în timpul măsurătorii
+    search = ProductSearch(db, min_age=float("inf"))
+    backends = [("pg_trgm", True)] if db.has_trigram_search() else []
+    backends.append(("memorie", False))
+    for label, trigram in backends:
+        search._trigram = trigram
+        if not trigram:
+            start = time.perf_counter()
+            search._memory_index()
+            print(f"[{label}] index construit în {time.perf_counter() - start:.1f}s")
+        for mode in MODES:
+            for q in QUERIES:
+                median, p95 = timed(lambda: search.search(q, "final", mode, 20, 0), 20)
+                db.connection.rollback()
+                print(f"[{label}] {mode:<9} {q!r:<16} median={median:7.2f}ms p95={p95:7.2f}ms")
+    db.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
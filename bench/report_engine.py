@@ -0,0 +1,91 @@
+"""Benchmark: exportul de vânzări pe rânduri dict vs. pe coloane NumPy.
+
+Rulare (pe o bază de date de test!): python -m bench.report_engine [scala]   (implicit 100000)
+Populează datele ca bench.explain_check, apoi agregă aceleași linii de
+comandă (total pe produs + pivot produs x zi) în două moduri, fiecare într-un
+proces separat ca să se poată măsura memoria de vârf:
+  dict     - RealDictCursor.fetchall() + dicționare Python cu Decimal
+  columnar - reports.fetch_columns (COPY binar) + group_by / pivot
+Raportează timpul și memoria suplimentară la un milion de rânduri.
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from bench.explain_check import seed
+from db import Database
+
+# Tot intervalul datelor sintetice (comenzile sunt generate înapoi de la now())
+START = date.today() - timedelta(days=3650)
+END = date.today() + timedelta(days=1)
+
+
+def run_dict(db):
+    import psycopg2.extras
+
+    import reports
+
+    sql, _ = reports.SOURCES["sales"]
+    with db.connection:
+        cur = db.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        # aceeași interogare, dar cu suma ca numeric (Decimal), cum o citește restul aplicației
+        cur.execute(sql.replace("(oc.quantity * oc.price * 100)::int8  AS amount_cents",
+                                "oc.quantity * oc.price AS amount"),
+                    {"start": START, "end": END})
+        rows = cur.fetchall()
+    totals = defaultdict(lambda: [0, 0])
+    by_day = defaultdict(lambda: defaultdict(int))
+    for r in rows:
+        t = totals[r["id_product"]]
+        t[0] += r["quantity"]
+        t[1] += r["amount"]
+        by_day[r["id_product"]][r["day"]] += r["amount"]
+    return len(rows)
+
+
+def run_columnar(db):
+    import reports
+
+    cols = reports.fetch_columns(db, *reports.SOURCES["sales"], {"start": START, "end": END})
+    reports.group_by(cols, ["id_product"], ["quantity", "amount_cents"])
+    reports.pivot(cols, "id_product", "day", "amount_cents")
+    return len(cols["day"])
+
+
+def child(mode):
+    # Rulează un singur mod și tipărește rezultatul ca JSON pentru procesul părinte
+    db = Database()
+    db.cursor.execute("SELECT 1")
+    db.connection.rollback()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    rows = (run_dict if mode == "dict" else run_columnar)(db)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    db.close()
+    print(json.dumps({"rows": rows, "seconds": elapsed, "rss_kb": peak}))
+
+
+def main(scale):
+    db = Database()
+    seed(db, scale)
+    db.close()
+    for mode in ("dict", "columnar"):
+        out = subprocess.run([sys.executable, "-m", "bench.report_engine", "--run", mode],
+                             check=True, capture_output=True, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        per_million = 1e6 / max(result["rows"], 1)
+        print(f"{mode:<9} rows={result['rows']} time={result['seconds']:.2f}s "
+              f"({result['seconds'] * per_million:.2f}s/1M) "
+              f"rss=+{result['rss_kb'] / 1024:.1f}MB ({result['rss_kb'] / 1024 * per_million:.1f}MB/1M)")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == "--run":
+        child(sys.argv[2])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
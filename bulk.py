@@ -0,0 +1,237 @@
+"""Import / export în masă pentru stock, partner_products și recipes prin COPY.
+
+Rulare: python bulk.py import|export stock|partner_products|recipes fișier.csv
+
+Importul copiază CSV-ul într-o tabelă temporară (toate coloanele TEXT),
+validează rândurile în SQL, raportează erorile pe linie și face merge
+(upsert) cu câteva instrucțiuni set-based, nu cu un INSERT pe rând.
+"""
+import json
+import sys
+
+# Interogările de export; coloanele sunt exact cele acceptate la import
+EXPORTS = {
+    "stock": """
+        SELECT name, price, description, quantity, type
+        FROM stock ORDER BY id_product
+    """,
+    "partner_products": """
+        SELECT p.username AS partner, s.name AS product, pp.price, pp.quantity
+        FROM partner_products pp
+        JOIN partners p ON p.id_partner = pp.id_partner
+        JOIN stock s    ON s.id_product = pp.id_stock
+        ORDER BY p.username, s.name
+    """,
+    "recipes": """
+        SELECT DISTINCT ON (f.name, m.name)
+               f.name AS final, r.quantity AS yield, m.name AS material, ri.quantity
+        FROM recipes r
+        JOIN stock f ON f.id_product = r.id_final
+        JOIN recipe_ingredients ri ON ri.id_recipe = r.id_recipe
+        JOIN stock m ON m.id_product = ri.id_material
+        ORDER BY f.name, m.name, r.id_recipe
+    """,
+}
+
+COLUMNS = {
+    "stock": ["name", "price", "description", "quantity", "type"],
+    "partner_products": ["partner", "product", "price", "quantity"],
+    "recipes": ["final", "yield", "material", "quantity"],
+}
+
+# Validare: o expresie SQL per regulă, evaluată pe tabela de staging
+PRICE_OK = "{col} ~ '^[0-9]{{1,8}}(\\.[0-9]{{1,2}})?$'"
+INT_OK = "{col} ~ '^[0-9]{{1,9}}$'"
+
+CHECKS = {
+    "stock": [
+        ("COALESCE(name, '') = ''", "nume lipsă"),
+        (f"NOT COALESCE({PRICE_OK.format(col='price')}, FALSE)", "preț invalid"),
+        (f"NOT COALESCE({INT_OK.format(col='quantity')}, FALSE)", "cantitate invalidă"),
+    ],
+    "partner_products": [
+        ("NOT EXISTS (SELECT 1 FROM partners p WHERE LOWER(p.username) = LOWER(st.partner))",
+         "partener inexistent"),
+        ("NOT EXISTS (SELECT 1 FROM stock s WHERE s.name = st.product)", "produs inexistent"),
+        (f"NOT COALESCE({PRICE_OK.format(col='price')}, FALSE)", "preț invalid"),
+        (f"NOT COALESCE({INT_OK.format(col='quantity')}, FALSE)", "cantitate invalidă"),
+    ],
+    "recipes": [
+        ("NOT EXISTS (SELECT 1 FROM stock s WHERE s.name = st.final)", "produs final inexistent"),
+        ("NOT EXISTS (SELECT 1 FROM stock s WHERE s.name = st.material)", "material inexistent"),
+        ("st.material = st.final", "produsul nu poate fi propriul ingredient"),
+        (f"CASE WHEN {INT_OK.format(col='yield')} THEN yield::int < 1 ELSE TRUE END",
+         "randament invalid"),
+        (f"CASE WHEN {INT_OK.format(col='quantity')} THEN quantity::int < 1 ELSE TRUE END",
+         "cantitate invalidă"),
+    ],
+}
+
+# Merge din staging (doar rândurile valide, ultima apariție a fiecărei chei;
+# la rețete, randamentul e cel de pe ultima linie a produsului final)
+MERGES = {
+    "stock": [
+        """
+        INSERT INTO stock (name, price, description, quantity, type)
+        SELECT DISTINCT ON (name)
+               name, price::numeric, COALESCE(description, ''), quantity::int,
+               COALESCE(NULLIF(type, ''), 'final')
+        FROM bulk_staging
+        ORDER BY name, line DESC
+        ON CONFLICT (name) DO UPDATE
+            SET price = EXCLUDED.price,
+                description = EXCLUDED.description,
+                quantity = EXCLUDED.quantity,
+                type = EXCLUDED.type
+        RETURNING (xmax = 0) AS inserted
+        """,
+    ],
+    "partner_products": [
+        """
+        CREATE TEMP TABLE bulk_resolved ON COMMIT DROP AS
+        SELECT DISTINCT ON (p.id_partner, s.id_product)
+               p.id_partner, s.id_product AS id_stock,
+               st.price::numeric AS price, st.quantity::int AS quantity
+        FROM bulk_staging st
+        JOIN partners p ON LOWER(p.username) = LOWER(st.partner)
+        JOIN stock s    ON s.name = st.product
+        ORDER BY p.id_partner, s.id_product, st.line DESC
+        """,
+        """
+        INSERT INTO partner_products (id_stock, price, quantity, id_partner)
+        SELECT r.id_stock, r.price, r.quantity, r.id_partner
+        FROM bulk_resolved r
+        ON CONFLICT (id_partner, id_stock) DO UPDATE
+            SET price = EXCLUDED.price, quantity = EXCLUDED.quantity
+        RETURNING (xmax = 0) AS inserted
+        """,
+    ],
+    "recipes": [
+        """
+        CREATE TEMP TABLE bulk_resolved ON COMMIT DROP AS
+        SELECT DISTINCT ON (f.id_product, m.id_product)
+               f.id_product AS id_final, st.yield::int AS yield,
+               m.id_product AS id_material, st.quantity::int AS quantity, st.line
+        FROM bulk_staging st
+        JOIN stock f ON f.name = st.final
+        JOIN stock m ON m.name = st.material
+        ORDER BY f.id_product, m.id_product, st.line DESC
+        """,
+        """
+        INSERT INTO recipes (id_final, quantity)
+        SELECT DISTINCT ON (r.id_final) r.id_final, r.yield
+        FROM bulk_resolved r
+        WHERE NOT EXISTS (SELECT 1 FROM recipes x WHERE x.id_final = r.id_final)
+        ORDER BY r.id_final, r.line DESC
+        RETURNING TRUE AS inserted
+        """,
+        """
+        CREATE TEMP TABLE bulk_targets ON COMMIT DROP AS
+        SELECT DISTINCT ON (id_final) id_final, id_recipe
+        FROM recipes
+        WHERE id_final IN (SELECT id_final FROM bulk_resolved)
+        ORDER BY id_final, id_recipe
+        """,
+        """
+        UPDATE recipes rc SET quantity = y.yield
+        FROM bulk_targets t
+        JOIN (SELECT DISTINCT ON (id_final) id_final, yield FROM bulk_resolved
+              ORDER BY id_final, line DESC) y
+          ON y.id_final = t.id_final
+        WHERE rc.id_recipe = t.id_recipe
+        """,
+        """
+        DELETE FROM recipe_ingredients ri
+        USING bulk_targets t
+        WHERE ri.id_recipe = t.id_recipe
+        """,
+        """
+        INSERT INTO recipe_ingredients (id_recipe, id_material, quantity)
+        SELECT t.id_recipe, r.id_material, r.quantity
+        FROM bulk_resolved r
+        JOIN bulk_targets t ON t.id_final = r.id_final
+        """,
+    ],
+}
+
+
+def export_csv(db, entity, out):
+    # Scrie tabela ca CSV (cu antet) în fișierul `out`, direct din COPY TO STDOUT
+    if entity not in EXPORTS:
+        raise ValueError(f"Entitate necunoscută: {entity}")
+    with db.connection:
+        db.cursor.copy_expert(f"COPY ({EXPORTS[entity]}) TO STDOUT WITH CSV HEADER", out)
+
+
+def import_csv(db, entity, source):
+    # Importă CSV-ul din fișierul `source`; întoarce raportul cu erorile pe linie
+    if entity not in COLUMNS:
+        return {"error": f"Entitate necunoscută: {entity}"}
+    cols = COLUMNS[entity]
+    cur = db.cursor
+    try:
+        with db.connection:
+            cur.execute(
+                "CREATE TEMP TABLE bulk_staging (line SERIAL, "
+                + ", ".join(f"{c} TEXT" for c in cols)
+                + ") ON COMMIT DROP")
+            cur.copy_expert(
+                f"COPY bulk_staging ({', '.join(cols)}) FROM STDIN WITH CSV HEADER", source)
+            # line = numărul rândului din fișier (antetul e linia 1)
+            cur.execute(
+                "SELECT line + 1 AS line, CASE "
+                + " ".join(f"WHEN {cond} THEN %s" for cond, _ in CHECKS[entity])
+                + " END AS error FROM bulk_staging st",
+                [msg for _, msg in CHECKS[entity]])
+            errors = [r for r in cur.fetchall() if r["error"]]
+            if errors:
+                cur.execute("DELETE FROM bulk_staging WHERE line + 1 = ANY(%s)",
+                            ([e["line"] for e in errors],))
+            cur.execute("SELECT COUNT(*) AS cnt FROM bulk_staging")
+            valid = cur.fetchone()["cnt"]
+            inserted = updated = 0
+            for sql in MERGES[entity]:
+                cur.execute(sql)
+                if cur.description and cur.description[0].name == "inserted":
+                    for row in cur.fetchall():
+                        if row["inserted"]:
+                            inserted += 1
+                        else:
+                            updated += 1
+    except Exception as exc:
+        db.connection.rollback()
+        return {"error": str(exc)}
+    if entity == "stock":
+        db.notify_stock_change(catalog=True)
+    return {
+        "success": True,
+        "rows": valid + len(errors),
+        "inserted": inserted,
+        "updated": updated,
+        "errors": errors,
+    }
+
+
+def main(argv):
+    from db import Database
+
+    if len(argv) != 3 or argv[0] not in ("import", "export"):
+        print(__doc__)
+        return 2
+    command, entity, path = argv
+    db = Database()
+    try:
+        if command == "export":
+            with open(path, "w", encoding="utf-8", newline="") as out:
+                export_csv(db, entity, out)
+            return 0
+        with open(path, encoding="utf-8", newline="") as source:
+            report = import_csv(db, entity, source)
+        print(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+        return 0 if report.get("success") else 1
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
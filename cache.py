@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class LocalBackend:
+    # Cache în memoria procesului: cheie -> (expiră_la, valoare)
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend:
+    # Cache partajat între procese; valoarea = etag + "\n" + corpul JSON
+    def __init__(self, url, prefix="catalog:"):
+        if redis is None:
+            raise RuntimeError("pachetul redis nu este instalat")
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        if raw is None:
+            return None
+        etag, body = raw.split(b"\n", 1)
+        return etag.decode(), body
+
+    def set(self, key, value, ttl):
+        etag, body = value
+        self._client.setex(self._prefix + key, int(ttl), etag.encode() + b"\n" + body)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(self._prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+
+class CatalogCache:
+    """Cache read-through pentru listele din catalog (stock), serializate JSON."""
+
+    def __init__(self, dumps, backend=None, ttl=None):
+        if backend is None:
+            url = os.getenv("CATALOG_CACHE_REDIS_URL")
+            backend = RedisBackend(url) if url else LocalBackend()
+        self.backend = backend
+        self.ttl = ttl if ttl is not None else float(os.getenv("CATALOG_CACHE_TTL") or 60)
+        self._dumps = dumps
+        # Crește la fiecare invalidate; o încărcare începută înainte nu mai scrie în cache
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        # Returnează (etag, corp JSON); None dacă loader-ul nu a întors nimic
+        entry = self.backend.get(key)
+        if entry is not None:
+            return entry
+        generation = self._generation
+        rows = loader()
+        if not rows:
+            return None
+        body = self._dumps(rows).encode()
+        entry = (hashlib.sha1(body).hexdigest(), body)
+        with self._lock:
+            # stocul s-a schimbat în timpul încărcării: rezultatul se servește, dar nu se păstrează
+            if generation == self._generation:
+                self.backend.set(key, entry, self.ttl)
+        return entry
+
+    def invalidate(self):
+        # Apelat după orice modificare a tabelei stock
+        with self._lock:
+            self._generation += 1
+            self.backend.clear()
@@ -1,35 +1,243 @@
+import logging
 import os
+import random
+import threading
+import time
+import uuid
 from datetime import datetime
+from decimal import Decimal
 
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
+import psycopg2.extensions
+import psycopg2.pool
 from dotenv import load_dotenv
 
+import migrations
+import sourcing
+from passwords import PasswordService
+from identity import IdentityCache
+from metrics import QueryMetrics
+
 load_dotenv()
+log = logging.getLogger(__name__)
+
+# Erori după care tranzacția poate fi reluată în siguranță
+RETRYABLE_ERRORS = (psycopg2.errors.DeadlockDetected, psycopg2.errors.SerializationFailure)
+
+
+class InsufficientStock(Exception):
+    # Ridicată când rezervarea nu poate acoperi cantitatea cerută
+    def __init__(self, product_ids):
+        super().__init__(
+            "Stoc insuficient pentru produsele: " + ", ".join(map(str, product_ids)))
+        self.product_ids = product_ids
+
+
+class JobAlreadyFinished(Exception):
+    # Ridicată când joburile de producție au fost deja încheiate de alt worker
+    def __init__(self, job_ids):
+        super().__init__("Joburi deja încheiate: " + ", ".join(map(str, job_ids)))
+        self.job_ids = job_ids
 
 
 class Database:
-    def __init__(self):
-        # Conectare la baza de date
-        self.connection = psycopg2.connect(
+    def __init__(self, schema_mode=None, instrumentation=None):
+        # Pool de conexiuni; fiecare fir de execuție (request) primește propria conexiune
+        minconn = int(os.getenv("DB_POOL_MIN") or 1)
+        maxconn = int(os.getenv("DB_POOL_MAX") or 10)
+        self.pool_timeout = float(os.getenv("DB_POOL_TIMEOUT") or 30)
+        self.pool_ping = (os.getenv("DB_POOL_PING") or "1") != "0"
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn, maxconn,
             dbname=os.getenv("DB_NAME"),
             user=os.getenv("DB_USER"),
             password=os.getenv("DB_PASSWORD"),
-            host=os.getenv("DB_HOST", "localhost"),
-            port=os.getenv("DB_PORT", "5432")
+            host=os.getenv("DB_HOST") or "localhost",
+            port=os.getenv("DB_PORT") or "5432"
         )
-        self.connection.autocommit = False
-        self.cursor = self.connection.cursor(
-            cursor_factory=psycopg2.extras.RealDictCursor
+        # ThreadedConnectionPool aruncă PoolError când e plin; semaforul îl face să aștepte
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._local = threading.local()
+        # Funcții apelate după orice modificare a tabelei stock (ex. invalidare cache)
+        self.stock_listeners = []
+        self.catalog_listeners = []
+        # Reîncercări la deadlock + contoare de contenție pe produs
+        self.retry_attempts = int(os.getenv("DB_RETRY_ATTEMPTS") or 3)
+        self._contention_lock = threading.Lock()
+        self.stock_contention = {}
+        # username -> id (clienți, angajați, parteneri), ca rutele să nu mai interogheze la fiecare hit
+        self.identities = IdentityCache(int(os.getenv("IDENTITY_CACHE_SIZE") or 1024))
+        # Hash-urile scrypt se calculează pe un pool separat, limitat (vezi passwords.py)
+        self.passwords = PasswordService()
+        # Câte rânduri aduce pe drum un cursor server-side în modul streaming
+        self.stream_itersize = int(os.getenv("DB_STREAM_ITERSIZE") or 2000)
+        # Instrumentare (timp pe metodă / interogare); DB_METRICS=0 o dezactivează
+        if instrumentation is None and (os.getenv("DB_METRICS") or "1") != "0":
+            instrumentation = QueryMetrics()
+        self.instrumentation = instrumentation
+        self.cursor_factory = (instrumentation.cursor_factory if instrumentation is not None
+                               else psycopg2.extras.RealDictCursor)
+        if instrumentation is not None:
+            instrumentation.instrument(self)
+        # Schema: 'migrate' aplică migrările lipsă (tabele, indecși, trigger-e, date de test),
+        # 'verify' doar verifică versiunea (pornire rapidă pentru workerii web),
+        # 'skip' nu atinge schema (folosit de CLI-ul din migrations.py)
+        schema_mode = schema_mode or os.getenv("DB_SCHEMA_MODE") or "migrate"
+        if schema_mode == "migrate":
+            migrations.apply(self)
+        elif schema_mode == "verify":
+            migrations.verify(self)
+        self.release()
+
+    @property
+    def connection(self):
+        # Conexiunea firului curent; se ia din pool la prima utilizare
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = self._checkout()
+        return conn
+
+    @property
+    def cursor(self):
+        # Cursorul partajat al conexiunii firului curent
+        cur = getattr(self._local, "cursor", None)
+        if cur is None or cur.closed:
+            cur = self.connection.cursor(cursor_factory=self.cursor_factory)
+            self._local.cursor = cur
+        return cur
+
+    def _checkout(self):
+        # Ia o conexiune sănătoasă din pool, reconectând dacă cea primită e căzută
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise psycopg2.pool.PoolError("connection pool exhausted")
+        try:
+            for _ in range(self.pool.maxconn + 1):
+                conn = self.pool.getconn()
+                if self._is_healthy(conn):
+                    conn.autocommit = False
+                    self._local.connection = conn
+                    self._local.cursor = None
+                    return conn
+                self.pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError("no healthy database connection")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _is_healthy(self, conn):
+        # Verificare rapidă a conexiunii înainte de a o da mai departe
+        if conn.closed:
+            return False
+        if not self.pool_ping:
+            return True
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def release(self):
+        # Returnează conexiunea firului curent în pool (apelat la finalul fiecărui request)
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            return
+        cur = getattr(self._local, "cursor", None)
+        self._local.connection = None
+        self._local.cursor = None
+        broken = bool(conn.closed)
+        try:
+            if cur is not None and not cur.closed:
+                cur.close()
+            if not broken and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        finally:
+            self.pool.putconn(conn, close=broken)
+            self._slots.release()
+
+    def close(self):
+        # Închide toate conexiunile din pool.
+        self.release()
+        self.pool.closeall()
+        self.passwords.shutdown()
+
+    def on_stock_change(self, callback):
+        # Înregistrează o funcție apelată după fiecare modificare a stocului
+        self.stock_listeners.append(callback)
+
+    def on_catalog_change(self, callback):
+        # Înregistrează o funcție apelată doar când se adaugă / redenumesc produse
+        self.catalog_listeners.append(callback)
+
+    def notify_stock_change(self, catalog=False):
+        # Anunță ascultătorii că stocul s-a modificat (după commit);
+        # catalog=True când s-au schimbat și produsele, nu doar cantitățile
+        for callback in self.stock_listeners:
+            callback()
+        if catalog:
+            for callback in self.catalog_listeners:
+                callback()
+
+    def _record_contention(self, product_ids, field, amount=1):
+        # Actualizează contoarele de contenție pentru produsele date
+        with self._contention_lock:
+            for pid in product_ids:
+                stats = self.stock_contention.setdefault(pid, {
+                    "reserved": 0, "insufficient": 0, "retries": 0, "lock_wait_ms": 0.0
+                })
+                stats[field] += amount
+
+    def get_stock_contention(self):
+        # Contoarele de contenție, cele mai disputate produse primele
+        with self._contention_lock:
+            rows = [{"id_product": pid, **stats} for pid, stats in self.stock_contention.items()]
+        rows.sort(key=lambda r: (r["retries"], r["lock_wait_ms"]), reverse=True)
+        return rows
+
+    def _run_with_retry(self, work, product_ids=()):
+        # Rulează work() într-o tranzacție; o reia la deadlock / serialization failure
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                with self.connection:
+                    return work()
+            except RETRYABLE_ERRORS:
+                self._record_contention(product_ids, "retries")
+                if attempt == self.retry_attempts:
+                    raise
+                time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+    def reserve_stock(self, demands):
+        # Scade atomic {id_product: cantitate} din stock cu un singur UPDATE condiționat;
+        # ridică InsufficientStock dacă vreun produs nu are destul (în tranzacția curentă)
+        if not demands:
+            return
+        ids = sorted(demands)
+        rows = psycopg2.extras.execute_values(
+            self.cursor,
+            """
+            UPDATE stock s SET quantity = s.quantity - d.qty
+            FROM (VALUES %s) AS d(id_product, qty)
+            WHERE s.id_product = d.id_product AND s.quantity >= d.qty
+            RETURNING s.id_product
+            """,
+            [(pid, demands[pid]) for pid in ids],
+            fetch=True
         )
-        # Creare tabele și trigger-e
-        self.create_tables()
-        self.create_triggers()
-        # Popularea cu date de test
-        self.generate_dummy_data()
+        reserved = {r["id_product"] for r in rows}
+        short = [pid for pid in ids if pid not in reserved]
+        if short:
+            self._record_contention(short, "insufficient")
+            raise InsufficientStock(short)
+        self._record_contention(ids, "reserved")
 
-    def create_tables(self):
+    def create_tables(self, commit=True):
         # Creează toate tabelele + alter şi index în aceeaşi instrucţiune
+        # (commit=False: în tranzacția apelantului, ca la migrări)
         sql = """
         CREATE TABLE IF NOT EXISTS employees (
             id SERIAL PRIMARY KEY,
@@ -78,18 +286,40 @@ class Database:
         CREATE TABLE IF NOT EXISTS recipes (
             id_recipe SERIAL PRIMARY KEY,
             id_final INTEGER NOT NULL REFERENCES stock(id_product),
-            quantity INTEGER NOT NULL DEFAULT 1,
-            id_material1 INTEGER NOT NULL REFERENCES stock(id_product),
-            quantity_material1 INTEGER NOT NULL,
-            id_material2 INTEGER REFERENCES stock(id_product),
-            quantity_material2 INTEGER,
-            id_material3 INTEGER REFERENCES stock(id_product),
-            quantity_material3 INTEGER,
-            id_material4 INTEGER REFERENCES stock(id_product),
-            quantity_material4 INTEGER,
-            id_material5 INTEGER REFERENCES stock(id_product),
-            quantity_material5 INTEGER
+            quantity INTEGER NOT NULL DEFAULT 1
         );
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            id_recipe INTEGER NOT NULL REFERENCES recipes(id_recipe) ON DELETE CASCADE,
+            id_material INTEGER NOT NULL REFERENCES stock(id_product),
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            PRIMARY KEY (id_recipe, id_material)
+        );
+        -- Migrare: rețetele vechi cu coloanele id_material1..5 trec în recipe_ingredients
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'recipes' AND column_name = 'id_material1') THEN
+                INSERT INTO recipe_ingredients (id_recipe, id_material, quantity)
+                SELECT r.id_recipe, m.id_material, SUM(m.quantity)
+                FROM recipes r
+                CROSS JOIN LATERAL (VALUES
+                    (r.id_material1, r.quantity_material1),
+                    (r.id_material2, r.quantity_material2),
+                    (r.id_material3, r.quantity_material3),
+                    (r.id_material4, r.quantity_material4),
+                    (r.id_material5, r.quantity_material5)
+                ) AS m(id_material, quantity)
+                WHERE m.id_material IS NOT NULL AND m.quantity > 0
+                GROUP BY r.id_recipe, m.id_material
+                ON CONFLICT DO NOTHING;
+                ALTER TABLE recipes
+                    DROP COLUMN id_material1, DROP COLUMN quantity_material1,
+                    DROP COLUMN id_material2, DROP COLUMN quantity_material2,
+                    DROP COLUMN id_material3, DROP COLUMN quantity_material3,
+                    DROP COLUMN id_material4, DROP COLUMN quantity_material4,
+                    DROP COLUMN id_material5, DROP COLUMN quantity_material5;
+            END IF;
+        END $$;
         CREATE TABLE IF NOT EXISTS partners (
             id_partner SERIAL PRIMARY KEY,
             name TEXT NOT NULL,
@@ -120,23 +350,79 @@ class Database:
             quantity INTEGER NOT NULL,
             price NUMERIC(10,2) NOT NULL
         );
+        CREATE TABLE IF NOT EXISTS production_jobs (
+            id_job SERIAL PRIMARY KEY,
+            id_final INTEGER NOT NULL REFERENCES stock(id_product),
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            status TEXT NOT NULL DEFAULT 'queued',
+            error TEXT,
+            id_employee INTEGER REFERENCES employees(id),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ
+        );
         """
         self.cursor.execute(sql)
-        self.connection.commit()
+        if commit:
+            self.connection.commit()
 
-    def create_triggers(self):
+    def create_indexes(self, commit=True):
+        # Indecși pentru fiecare cale de căutare folosită de metodele clasei
+        # (cheile străine, LOWER(username) și ordonările pe data comenzii)
+        sql = """
+        CREATE INDEX IF NOT EXISTS idx_customers_username_lower ON customers (LOWER(username));
+        CREATE INDEX IF NOT EXISTS idx_employees_username_lower ON employees (LOWER(username));
+        CREATE INDEX IF NOT EXISTS idx_partners_username_lower  ON partners (LOWER(username));
+        CREATE INDEX IF NOT EXISTS idx_stock_name_lower         ON stock (LOWER(name));
+        CREATE INDEX IF NOT EXISTS idx_orders_client_data
+            ON orders (id_client, data DESC, id_order DESC);
+        CREATE INDEX IF NOT EXISTS idx_orders_employee_data
+            ON orders (id_employee, data DESC, id_order DESC);
+        CREATE INDEX IF NOT EXISTS idx_orders_progress_data     ON orders (progress, data DESC);
+        CREATE INDEX IF NOT EXISTS idx_order_content_order      ON order_content (id_order);
+        CREATE INDEX IF NOT EXISTS idx_order_content_product    ON order_content (id_product);
+        CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_material
+            ON recipe_ingredients (id_material);
+        CREATE INDEX IF NOT EXISTS idx_partner_products_stock_price
+            ON partner_products (id_stock, price);
+        CREATE INDEX IF NOT EXISTS idx_partner_products_partner ON partner_products (id_partner);
+        CREATE INDEX IF NOT EXISTS idx_partner_orders_partner_data
+            ON partner_orders (id_partner, data DESC);
+        CREATE INDEX IF NOT EXISTS idx_partner_orders_employee_data
+            ON partner_orders (id_employee, data DESC, id_order DESC);
+        CREATE INDEX IF NOT EXISTS idx_partner_order_content_order
+            ON partner_order_content (id_order);
+        CREATE INDEX IF NOT EXISTS idx_partner_order_content_product
+            ON partner_order_content (id_product);
+        CREATE INDEX IF NOT EXISTS idx_production_jobs_queued
+            ON production_jobs (id_job) WHERE status = 'queued';
+        """
+        self.cursor.execute(sql)
+        if commit:
+            self.connection.commit()
+
+    def create_triggers(self, commit=True):
         # Creeaza trigger-e pentru actualizarea stocului la inserare, actualizare și ștergere
         sql = """
-        CREATE OR REPLACE FUNCTION trg_before_insert_order_content_fn() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+        DROP TRIGGER IF EXISTS trg_before_insert_order_content ON order_content;
+        CREATE OR REPLACE FUNCTION trg_after_insert_order_content_fn() RETURNS TRIGGER LANGUAGE plpgsql AS $$
+        DECLARE
+            wanted INTEGER;
+            done INTEGER;
         BEGIN
-            IF (SELECT quantity FROM stock WHERE id_product = NEW.id_product) < NEW.quantity THEN
+            -- Decrement condiționat: verificarea și scăderea sunt aceeași instrucțiune
+            SELECT COUNT(DISTINCT id_product) INTO wanted FROM new_rows;
+            UPDATE stock s SET quantity = s.quantity - n.qty
+            FROM (SELECT id_product, SUM(quantity) AS qty FROM new_rows GROUP BY id_product) n
+            WHERE s.id_product = n.id_product AND s.quantity >= n.qty;
+            GET DIAGNOSTICS done = ROW_COUNT;
+            IF done < wanted THEN
                 RAISE EXCEPTION 'Insufficient stock';
             END IF;
-            UPDATE stock SET quantity = quantity - NEW.quantity WHERE id_product = NEW.id_product;
-            RETURN NEW;
+            RETURN NULL;
         END; $$;
-        DROP TRIGGER IF EXISTS trg_before_insert_order_content ON order_content;
-        CREATE TRIGGER trg_before_insert_order_content BEFORE INSERT ON order_content FOR EACH ROW EXECUTE FUNCTION trg_before_insert_order_content_fn();
+        DROP TRIGGER IF EXISTS trg_after_insert_order_content ON order_content;
+        CREATE TRIGGER trg_after_insert_order_content AFTER INSERT ON order_content REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION trg_after_insert_order_content_fn();
         CREATE OR REPLACE FUNCTION trg_before_update_order_content_fn() RETURNS TRIGGER LANGUAGE plpgsql AS $$
         BEGIN
             IF NEW.quantity > OLD.quantity AND (SELECT quantity FROM stock WHERE id_product = NEW.id_product) < (NEW.quantity - OLD.quantity) THEN
@@ -182,7 +468,8 @@ class Database:
         CREATE TRIGGER trg_before_delete_partner_order_content BEFORE DELETE ON partner_order_content FOR EACH ROW EXECUTE FUNCTION trg_before_delete_partner_order_content_fn();
         """
         self.cursor.execute(sql)
-        self.connection.commit()
+        if commit:
+            self.connection.commit()
         self.cursor.execute("""
         CREATE OR REPLACE FUNCTION trg_after_update_partner_order_status_fn()
         RETURNS TRIGGER LANGUAGE plpgsql AS $$
@@ -206,17 +493,30 @@ class Database:
         AFTER UPDATE OF status ON partner_orders
         FOR EACH ROW EXECUTE FUNCTION trg_after_update_partner_order_status_fn();
         """)
-        self.connection.commit()
+        if commit:
+            self.connection.commit()
 
     def _dict_cur(self):
         # Creeaza un cursor cu suport pentru dict-uri
-        return self.connection.cursor(
-            cursor_factory=psycopg2.extras.RealDictCursor
-        )
+        return self.connection.cursor(cursor_factory=self.cursor_factory)
+
+    def _iter_query(self, sql, params=None):
+        # Generator peste rezultat printr-un cursor server-side (named):
+        # rândurile vin din Postgres câte stream_itersize, nu toate odată.
+        with self.connection.cursor(
+            name=f"stream_{uuid.uuid4().hex}",
+            cursor_factory=self.cursor_factory
+        ) as cur:
+            cur.itersize = self.stream_itersize
+            cur.execute(sql, params)
+            yield from cur
 
     # === new partner helpers ===
     def get_partner_id(self, username: str):
-        """Returnează id-ul partenerului sau None."""
+        """Returnează id-ul partenerului sau None (din cache-ul de identități)."""
+        return self.identities.get_or_load("partner", username, self._load_partner_id)
+
+    def _load_partner_id(self, username):
         with self._dict_cur() as cur:
             cur.execute(
                 "SELECT id_partner FROM partners WHERE LOWER(username)=LOWER(%s)",
@@ -232,39 +532,54 @@ class Database:
             return row["name"] if row else None
     # ===========================
 
-    def get_stock(self, final_only=True):
-        # returnează toate produsele din stoc
+    def get_stock(self, final_only=True, stream=False):
+        # returnează toate produsele din stoc (stream=True: generator, cursor server-side)
+        sql = "SELECT * FROM stock WHERE type='final'" if final_only else "SELECT * FROM stock"
+        if stream:
+            return self._iter_query(sql)
         with self._dict_cur() as cur:
-            if final_only:
-                cur.execute("SELECT * FROM stock WHERE type='final'")
-            else:
-                cur.execute("SELECT * FROM stock")
+            cur.execute(sql)
             return cur.fetchall()
 
     def get_cheapest_partner_offer(self):
         # returnează cele mai ieftine oferte de la parteneri pentru fiecare produs
+        # (din partner_best_offers, întreținută de trigger-ele pe partner_products)
         self.cursor.execute(
             """
             SELECT s.id_product,
                    s.name,
                    s.quantity,
                    s.type,
-                   pp.price             AS partner_price,
+                   bo.price             AS partner_price,
+                   bo.id_partner        AS id_partner,
                    pr.name              AS partner_name
             FROM stock s
-            LEFT JOIN LATERAL (
-                SELECT price, id_partner
-                FROM partner_products
-                WHERE id_stock = s.id_product
-                ORDER BY price ASC
-                LIMIT 1
-            ) pp ON TRUE
-            LEFT JOIN partners pr ON pr.id_partner = pp.id_partner
+            LEFT JOIN partner_best_offers bo ON bo.id_stock = s.id_product AND bo.rank = 1
+            LEFT JOIN partners pr ON pr.id_partner = bo.id_partner
             ORDER BY s.id_product
             """
         )
         return self.cursor.fetchall()
 
+    def get_best_partner_offers(self, stock_ids=None, top_k=1):
+        # Primele top_k (maxim 3) oferte pentru produsele date (sau toate), cu stocul partenerului.
+        sql = """
+            SELECT bo.id_stock, bo.rank, bo.id_offer, bo.id_partner, bo.price,
+                   pp.quantity AS partner_quantity, pr.name AS partner_name
+            FROM partner_best_offers bo
+            JOIN partner_products pp ON pp.id_product = bo.id_offer
+            JOIN partners pr         ON pr.id_partner = bo.id_partner
+            WHERE bo.rank <= %s
+        """
+        params = [top_k]
+        if stock_ids is not None:
+            sql += " AND bo.id_stock = ANY(%s)"
+            params.append(list(stock_ids))
+        sql += " ORDER BY bo.id_stock, bo.rank"
+        with self._dict_cur() as cur:
+            cur.execute(sql, tuple(params))
+            return cur.fetchall()
+
     def get_employees(self):
         # Listă completă de angajați.
         self.cursor.execute("SELECT * FROM employees")
@@ -285,8 +600,10 @@ class Database:
         self.cursor.execute("SELECT * FROM order_content")
         return self.cursor.fetchall()
 
-    def get_partners(self):
+    def get_partners(self, stream=False):
         # Listă completă de parteneri.
+        if stream:
+            return self._iter_query("SELECT * FROM partners ORDER BY id_partner")
         self.cursor.execute("SELECT * FROM partners")
         return self.cursor.fetchall()
 
@@ -331,9 +648,119 @@ class Database:
         return self.cursor.fetchall()
 
     def get_recipes(self):
-        # Rețetele existente.
+        # Rețetele existente, fiecare cu produsul final și lista de ingrediente (cu stoc).
+        with self._dict_cur() as cur:
+            cur.execute(
+                """
+                SELECT r.id_recipe,
+                       r.id_final,
+                       r.quantity,
+                       f.name     AS final_name,
+                       f.quantity AS final_stock,
+                       COALESCE(
+                           json_agg(json_build_object(
+                               'id_material', ri.id_material,
+                               'name',        m.name,
+                               'quantity',    ri.quantity,
+                               'stock',       m.quantity
+                           ) ORDER BY ri.id_material) FILTER (WHERE ri.id_material IS NOT NULL),
+                           '[]'
+                       ) AS ingredients
+                FROM recipes r
+                JOIN stock f ON f.id_product = r.id_final
+                LEFT JOIN recipe_ingredients ri ON ri.id_recipe = r.id_recipe
+                LEFT JOIN stock m ON m.id_product = ri.id_material
+                GROUP BY r.id_recipe, f.id_product
+                ORDER BY r.id_recipe
+                """
+            )
+            return cur.fetchall()
+
+    def get_recipe_feasibility(self, batches=1, recipe_id=None):
+        # Pentru fiecare rețetă: câte loturi se pot produce din stocul curent
+        # (min peste ingrediente din stoc / cantitate), materialul limitativ și
+        # lipsurile pentru `batches` loturi cerute. recipe_id = id-ul produsului final.
+        sql = """
+            WITH per_ing AS (
+                SELECT ri.id_recipe,
+                       ri.id_material,
+                       m.name,
+                       ri.quantity              AS per_batch,
+                       m.quantity               AS stock,
+                       m.quantity / ri.quantity AS batches,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY ri.id_recipe
+                           ORDER BY m.quantity / ri.quantity, ri.id_material
+                       ) AS rn
+                FROM recipe_ingredients ri
+                JOIN stock m ON m.id_product = ri.id_material
+            )
+            SELECT r.id_recipe,
+                   r.id_final,
+                   f.name                AS final_name,
+                   f.quantity            AS final_stock,
+                   b.batches             AS max_batches,
+                   b.batches * r.quantity AS max_units,
+                   b.id_material         AS bottleneck_id,
+                   b.name                AS bottleneck_name,
+                   COALESCE(
+                       json_agg(json_build_object(
+                           'id_material', p.id_material,
+                           'name',        p.name,
+                           'needed',      p.per_batch * %(batches)s,
+                           'stock',       p.stock,
+                           'missing',     p.per_batch * %(batches)s - p.stock
+                       ) ORDER BY p.id_material) FILTER (WHERE p.per_batch * %(batches)s > p.stock),
+                       '[]'
+                   ) AS shortfall
+            FROM recipes r
+            JOIN stock f   ON f.id_product = r.id_final
+            JOIN per_ing b ON b.id_recipe = r.id_recipe AND b.rn = 1
+            JOIN per_ing p ON p.id_recipe = r.id_recipe
+        """
+        params = {"batches": batches}
+        if recipe_id is not None:
+            sql += " WHERE r.id_final = %(recipe_id)s"
+            params["recipe_id"] = recipe_id
+        sql += """
+            GROUP BY r.id_recipe, f.id_product, b.batches, b.id_material, b.name
+            ORDER BY r.id_recipe
+        """
         with self._dict_cur() as cur:
-            cur.execute("SELECT * FROM recipes")
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def get_bom(self):
+        # Lista de materiale pe produs: {id_final, quantity (randament), materials {id: cant.}};
+        # dacă un produs are mai multe rețete se folosește prima (ca în produce_product).
+        with self._dict_cur() as cur:
+            cur.execute(
+                """
+                SELECT DISTINCT ON (r.id_final)
+                       r.id_final,
+                       r.quantity,
+                       json_object_agg(ri.id_material, ri.quantity) AS materials
+                FROM recipes r
+                JOIN recipe_ingredients ri ON ri.id_recipe = r.id_recipe
+                GROUP BY r.id_recipe
+                ORDER BY r.id_final, r.id_recipe
+                """
+            )
+            return cur.fetchall()
+
+    def get_open_partner_quantities(self):
+        # Cantitățile deja comandate la parteneri și încă nelivrate, pe produs din stoc.
+        with self._dict_cur() as cur:
+            cur.execute(
+                """
+                SELECT pp.id_stock AS id_product, SUM(poc.quantity) AS quantity
+                FROM partner_orders po
+                JOIN partner_order_content poc ON poc.id_order = po.id_order
+                JOIN partner_products pp       ON pp.id_product = poc.id_product
+                WHERE po.status NOT IN ('completed', 'cancelled')
+                GROUP BY pp.id_stock
+                """
+            )
             return cur.fetchall()
 
     def get_order_quantity(self, order_id):
@@ -356,34 +783,45 @@ class Database:
             q = row["qty"] if row else None
         return q or 0
 
+    def _verify(self, table, id_col, role, username, password, legacy_casefold=False):
+        # Verifică parola pe pool-ul de hash; întoarce id-ul contului sau None.
+        # Parolele vechi (în clar sau cu parametri slabi) se rescriu ca hash la login.
+        self.passwords.throttle(role, username)
+        with self._dict_cur() as cur:
+            cur.execute(
+                f"SELECT {id_col} AS id, password FROM {table} WHERE LOWER(username)=LOWER(%s)",
+                (username,))
+            row = cur.fetchone()
+        # nicio tranzacție deschisă cât timp rulează scrypt
+        self.connection.rollback()
+        ok, new_hash = self.passwords.check(row["password"] if row else None, password, legacy_casefold)
+        if not ok:
+            return None
+        if new_hash:
+            with self.connection:
+                self.cursor.execute(
+                    f"UPDATE {table} SET password=%s WHERE {id_col}=%s AND password=%s",
+                    (new_hash, row["id"], row["password"]))
+        return row["id"]
+
     def verify_customer(self, username, password):
-        # verficare parolă client
-        self.cursor.execute(
-            "SELECT 1 FROM customers WHERE LOWER(username)=LOWER(%s) AND password=%s",
-            (username, password)
-        )
-        return self.cursor.fetchone() is not None
+        # verficare parolă client; id-ul clientului sau None
+        return self._verify("customers", "id_customer", "customer", username, password)
 
     def verify_employee(self, username, password):
-        # verificare parolă angajat
-        self.cursor.execute(
-            "SELECT 1 FROM employees WHERE LOWER(username)=LOWER(%s) AND password=%s",
-            (username, password)
-        )
-        return self.cursor.fetchone() is not None
+        # verificare parolă angajat; id-ul angajatului sau None
+        return self._verify("employees", "id", "employee", username, password)
 
     def verify_partner(self, username, password):
-        # verificare parolă partener
-        self.cursor.execute(
-            "SELECT 1 FROM partners "
-            "WHERE LOWER(username)=LOWER(%s) "
-            "  AND LOWER(password)=LOWER(%s)",
-            (username, password)
-        )
-        return self.cursor.fetchone() is not None
+        # verificare parolă partener; id-ul partenerului sau None
+        # (parolele încă în clar se compară case-insensitive, ca înainte)
+        return self._verify("partners", "id_partner", "partner", username, password,
+                            legacy_casefold=True)
 
     def reset_customer_password(self, username, new_password):
-        # Resetare parolă client.
+        # Resetare parolă client. Hash-ul se calculează înainte de prima instrucțiune, ca
+        # tranzacția să nu stea deschisă cât așteaptă scrypt (PasswordPoolBusy se propagă).
+        hashed = self.passwords.hash(new_password)
         self.cursor.execute(
             "SELECT 1 FROM customers WHERE username = %s", (username,)
         )
@@ -392,16 +830,18 @@ class Database:
         try:
             self.cursor.execute(
                 "UPDATE customers SET password = %s WHERE username = %s",
-                (new_password, username)
+                (hashed, username)
             )
             self.connection.commit()
+            self.identities.invalidate("customer", username)
             return {"success": True}
         except Exception as exc:
             self.connection.rollback()
             return {"error": str(exc)}
 
     def reset_employee_password(self, username, new_password):
-        # Resetare parolă angajat.
+        # Resetare parolă angajat (hash-ul înaintea tranzacției, ca la client).
+        hashed = self.passwords.hash(new_password)
         self.cursor.execute(
             "SELECT 1 FROM employees WHERE username = %s", (username,)
         )
@@ -409,11 +849,75 @@ class Database:
             return {"error": "User not found"}
         self.cursor.execute(
             "UPDATE employees SET password = %s WHERE username = %s",
-            (new_password, username)
+            (hashed, username)
         )
         self.connection.commit()
+        self.identities.invalidate("employee", username)
         return {"success": True}
 
+    def create_search_index(self):
+        # pg_trgm + index GIN pe LOWER(name); False (fără a strica tranzacția)
+        # dacă extensia nu e disponibilă sau utilizatorul nu o poate instala.
+        # Idempotentă: se poate rula din nou după instalarea extensiei.
+        self.cursor.execute("SAVEPOINT search_index")
+        try:
+            self.cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_stock_name_trgm "
+                "ON stock USING gin (LOWER(name) gin_trgm_ops)")
+        except psycopg2.Error as exc:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT search_index")
+            log.warning("pg_trgm indisponibil, căutarea folosește indexul din memorie: %s", exc)
+            return False
+        self.cursor.execute("RELEASE SAVEPOINT search_index")
+        return True
+
+    def has_trigram_search(self):
+        # True dacă indexul trigram din create_search_index există
+        with self._dict_cur() as cur:
+            cur.execute("SELECT to_regclass('idx_stock_name_trgm') IS NOT NULL AS present")
+            return cur.fetchone()["present"]
+
+    def search_products(self, q, type=None, mode="fuzzy", limit=20, offset=0):
+        # Căutare pe indexul pg_trgm: mode = prefix | substring | fuzzy (word similarity).
+        # Scor: 3 exact, 2 prefix, 1 subșir, plus word_similarity.
+        q = q.strip().lower()
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params = {
+            "q": q,
+            "prefix": escaped + "%",
+            "substr": "%" + escaped + "%",
+            "type": type,
+            "limit": limit,
+            "offset": offset,
+        }
+        match = "LOWER(s.name) LIKE %(prefix)s" if mode == "prefix" else "LOWER(s.name) LIKE %(substr)s"
+        if mode == "fuzzy":
+            match = f"({match} OR %(q)s <%% LOWER(s.name))"
+        with self._dict_cur() as cur:
+            cur.execute(
+                f"""
+                SELECT s.*,
+                       (CASE WHEN LOWER(s.name) = %(q)s THEN 3
+                             WHEN LOWER(s.name) LIKE %(prefix)s THEN 2
+                             WHEN LOWER(s.name) LIKE %(substr)s THEN 1
+                             ELSE 0 END
+                        + word_similarity(%(q)s, LOWER(s.name)))::float AS score
+                FROM stock s
+                WHERE {match}
+                  AND (%(type)s::text IS NULL OR s.type = %(type)s)
+                ORDER BY score DESC, LOWER(s.name)
+                LIMIT %(limit)s OFFSET %(offset)s
+                """,
+                params)
+            return cur.fetchall()
+
+    def get_products_by_ids(self, ids):
+        # Rândurile din stock pentru id-urile date (ordinea nu e garantată)
+        with self._dict_cur() as cur:
+            cur.execute("SELECT * FROM stock WHERE id_product = ANY(%s)", (list(ids),))
+            return cur.fetchall()
+
     def search_product_by_name(self, name):
         # Căutare produs după nume.
         self.cursor.execute(
@@ -439,7 +943,10 @@ class Database:
         return self.cursor.fetchall()
 
     def get_customer_id(self, username):
-        # id-ul clientului cu un anumit username.
+        # id-ul clientului cu un anumit username (din cache-ul de identități).
+        return self.identities.get_or_load("customer", username, self._load_customer_id)
+
+    def _load_customer_id(self, username):
         with self._dict_cur() as cur:
             cur.execute(
                 "SELECT id_customer FROM customers WHERE LOWER(username)=LOWER(%s)",
@@ -448,13 +955,15 @@ class Database:
             return row['id_customer'] if row else None
 
     def create_customer(self, name, surname, username, password, email, address='', phone_number=''):
-        # adaugă un client în baza de date.
+        # adaugă un client în baza de date (PasswordPoolBusy dacă pool-ul de hash e plin).
+        hashed = self.passwords.hash(password)
         self.cursor.execute(
             "INSERT INTO customers (name,surname,username,password,email,address,phone_number) "
             "VALUES (%s,%s,%s,%s,%s,%s,%s)",
-            (name, surname, username, password, email, address, phone_number)
+            (name, surname, username, hashed, email, address, phone_number)
         )
         self.connection.commit()
+        self.identities.invalidate("customer", username)
         return {"success": True}
 
     def get_customer_by_username(self, username):
@@ -483,8 +992,9 @@ class Database:
         )
         return self.cursor.fetchone()
 
-    def generate_dummy_data(self):
-        # adaugă date de test în baza de date.
+    def generate_dummy_data(self, commit=True):
+        # adaugă date de test în baza de date; cu commit=False erorile se propagă
+        # (tranzacția apelantului, de ex. migrarea, se anulează întreagă).
         try:
             with self._dict_cur() as cur:
                 cur.execute("SELECT COUNT(*) AS cnt FROM employees")
@@ -604,45 +1114,28 @@ class Database:
                         self.cursor.execute("SELECT id_product,name FROM stock")
                         id_by_name = {r['name']: r['id_product'] for r in self.cursor.fetchall()}
                         recipes_rows = [
-                            (id_by_name["Cola 0.5 L"], 1,
-                             id_by_name["Apă carbogazoasă"], 1,
-                             id_by_name["Zahăr"], 1,
-                             id_by_name["Colorant caramel"], 1,
-                             id_by_name["Acid fosforic"], 1,
-                             id_by_name["Cofeină"], 1),
-                            (id_by_name["Cola 1 L"], 1,
-                             id_by_name["Apă carbogazoasă"], 2,
-                             id_by_name["Zahăr"], 2,
-                             id_by_name["Colorant caramel"], 2,
-                             id_by_name["Acid fosforic"], 2,
-                             id_by_name["Cofeină"], 2),
-                            (id_by_name["Orange Soda 0.5 L"], 1,
-                             id_by_name["Apă carbogazoasă"], 1,
-                             id_by_name["Zahăr"], 1,
-                             id_by_name["Aromă portocale"], 1,
-                             None, None,
-                             None, None),
-                            (id_by_name["Lemonade 0.5 L"], 1,
-                             id_by_name["Apă carbogazoasă"], 1,
-                             id_by_name["Zahăr"], 1,
-                             id_by_name["Aromă lămâie"], 1,
-                             None, None,
-                             None, None),
+                            ("Cola 0.5 L", [("Apă carbogazoasă", 1), ("Zahăr", 1),
+                                            ("Colorant caramel", 1), ("Acid fosforic", 1),
+                                            ("Cofeină", 1)]),
+                            ("Cola 1 L", [("Apă carbogazoasă", 2), ("Zahăr", 2),
+                                          ("Colorant caramel", 2), ("Acid fosforic", 2),
+                                          ("Cofeină", 2)]),
+                            ("Orange Soda 0.5 L", [("Apă carbogazoasă", 1), ("Zahăr", 1),
+                                                   ("Aromă portocale", 1)]),
+                            ("Lemonade 0.5 L", [("Apă carbogazoasă", 1), ("Zahăr", 1),
+                                                ("Aromă lămâie", 1)]),
                         ]
-                        for (idf, qty,
-                             m1, q1, m2, q2, m3, q3,
-                             m4, q4, m5, q5) in recipes_rows:
-                            self.cursor.execute("""
-                                INSERT INTO recipes (id_final, quantity,
-                                                     id_material1, quantity_material1,
-                                                     id_material2, quantity_material2,
-                                                     id_material3, quantity_material3,
-                                                     id_material4, quantity_material4,
-                                                     id_material5, quantity_material5)
-                                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                            """, (idf, qty,
-                                  m1, q1, m2, q2, m3, q3,
-                                  m4, q4, m5, q5))
+                        for final_name, mats in recipes_rows:
+                            self.cursor.execute(
+                                "INSERT INTO recipes (id_final, quantity) "
+                                "VALUES (%s,1) RETURNING id_recipe",
+                                (id_by_name[final_name],))
+                            rid = self.cursor.fetchone()["id_recipe"]
+                            psycopg2.extras.execute_values(
+                                self.cursor,
+                                "INSERT INTO recipe_ingredients (id_recipe, id_material, quantity) VALUES %s",
+                                [(rid, id_by_name[nm], q) for nm, q in mats]
+                            )
                 with self._dict_cur() as cur:
                     cur.execute("SELECT COUNT(*) AS cnt FROM orders")
                     if cur.fetchone()["cnt"] == 0:
@@ -674,10 +1167,12 @@ class Database:
                                 "(id_order, id_product, quantity, price) "
                                 "VALUES (%s,%s,%s,%s)",
                                 (oid, pid, qty, price))
-            self.connection.commit()
-        except Exception as exc:
-            import traceback, sys
-            traceback.print_exc(file=sys.stderr)
+            if commit:
+                self.connection.commit()
+        except Exception:
+            if not commit:
+                raise
+            log.exception("generate_dummy_data failed")
             self.connection.rollback()
 
     def get_partner_order(self, order_id, employee_id=None):
@@ -690,109 +1185,194 @@ class Database:
         self.cursor.execute(sql, tuple(params))
         return self.cursor.fetchone()
 
-    def get_partner_orders_by_partner(self, partner_id):
+    def get_partner_orders_by_employee(self, employee_id, status=None, limit=None, after=None):
+        # Comenzile către parteneri ale unui angajat, cu numele partenerului.
+        # after = (data, id_order) al ultimei comenzi din pagina anterioară (keyset).
+        sql = """
+            SELECT po.*, p.name AS partner
+            FROM partner_orders po
+            JOIN partners p ON p.id_partner = po.id_partner
+            WHERE po.id_employee = %s
+        """
+        params = [employee_id]
+        if status:
+            sql += " AND po.status = ANY(%s)"
+            params.append(list(status))
+        if after is not None:
+            sql += " AND (po.data, po.id_order) < (%s, %s)"
+            params.extend(after)
+        sql += " ORDER BY po.data DESC, po.id_order DESC"
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+        with self._dict_cur() as cur:
+            cur.execute(sql, tuple(params))
+            return cur.fetchall()
+
+    def get_partner_orders_by_partner(self, partner_id, stream=False):
         # Comenzile partenerului cu un anumit ID.
-        self.cursor.execute(
-            "SELECT * FROM partner_orders "
-            "WHERE id_partner=%s "
-            "ORDER BY data DESC",
-            (partner_id,)
-        )
+        sql = ("SELECT * FROM partner_orders "
+               "WHERE id_partner=%s "
+               "ORDER BY data DESC")
+        if stream:
+            return self._iter_query(sql, (partner_id,))
+        self.cursor.execute(sql, (partner_id,))
         return self.cursor.fetchall()
 
     def update_partner_prices(self, partner_id: int, price_list: list[dict]):
-        # Actualizează prețurile partenerului pentru produsele date.
-        with self.connection:
+        # Actualizează prețurile partenerului pentru produsele date:
+        # un singur DELETE (preț <= 0) și un singur upsert pentru restul.
+        latest: dict[int, float] = {}
+        try:
             for item in price_list:
-                pid   = item["id_product"]
-                price = item["price"]
-                # preț <= 0 sterge produsul
-                if price <= 0:
+                latest[int(item["id_product"])] = float(item["price"])
+        except (KeyError, TypeError, ValueError):
+            return {"error": "Listă de prețuri invalidă"}
+        removed = [pid for pid, price in latest.items() if price <= 0]
+        upserts = [(pid, price, partner_id) for pid, price in latest.items() if price > 0]
+        try:
+            with self.connection:
+                if removed:
                     self.cursor.execute(
                         "DELETE FROM partner_products "
-                        "WHERE id_stock=%s AND id_partner=%s",
-                        (pid, partner_id)
+                        "WHERE id_partner=%s AND id_stock = ANY(%s)",
+                        (partner_id, removed)
                     )
-                    continue
-                self.cursor.execute(
-                    "UPDATE partner_products "
-                    "SET price=%s "
-                    "WHERE id_stock=%s AND id_partner=%s",
-                    (price, pid, partner_id)
-                )
-                # dacă nu exista rând, facem inserare
-                if self.cursor.rowcount == 0:
-                    self.cursor.execute(
-                        "INSERT INTO partner_products "
-                        "  (id_stock, price, quantity, id_partner) "
-                        "VALUES (%s,%s,0,%s)",
-                        (pid, price, partner_id)
+                if upserts:
+                    # produsele noi intră cu cantitate 0
+                    psycopg2.extras.execute_values(
+                        self.cursor,
+                        "INSERT INTO partner_products (id_stock, price, id_partner, quantity) "
+                        "VALUES %s "
+                        "ON CONFLICT (id_partner, id_stock) DO UPDATE SET price = EXCLUDED.price",
+                        upserts,
+                        template="(%s, %s, %s, 0)",
+                        page_size=1000
                     )
-        return {"success": True}
+            return {"success": True}
+        except Exception as exc:
+            self.connection.rollback()
+            return {"error": str(exc)}
 
-    def produce_product(self, recipe_id, quantity):
-        # Produce un produs pe baza rețetei.
+    def produce_product(self, recipe_id, quantity, job_ids=None):
+        # Produce un produs pe baza rețetei; job_ids (din claim_production_jobs) sunt
+        # marcate 'done' în aceeași tranzacție, ca un job reluat să nu fie produs de două ori.
         if quantity <= 0:
             return {"error": "Invalid quantity"}
         self.cursor.execute("""
-            SELECT r.*, s.name, s.price, s.description, s.type
+            SELECT r.id_recipe, r.quantity, s.name, s.price, s.description, s.type,
+                   COALESCE(json_object_agg(ri.id_material, ri.quantity)
+                            FILTER (WHERE ri.id_material IS NOT NULL), '{}') AS materials
             FROM recipes r
             JOIN stock  s ON s.id_product = r.id_final
+            LEFT JOIN recipe_ingredients ri ON ri.id_recipe = r.id_recipe
             WHERE r.id_final = %s
+            GROUP BY r.id_recipe, s.id_product
+            ORDER BY r.id_recipe
+            LIMIT 1
         """, (recipe_id,))
         recipe = self.cursor.fetchone()
         if not recipe:
             return {"error": "Recipe not found"}
-        try:
-            with self.connection:
-                for i in range(1, 6):
-                    mat_id = recipe.get(f"id_material{i}")
-                    mat_qty = recipe.get(f"quantity_material{i}")
-                    if mat_id and mat_qty:
-                        need = mat_qty * quantity
-                        have = None
-                        with self._dict_cur() as qc:
-                            qc.execute(
-                                "SELECT quantity FROM stock WHERE id_product=%s",
-                                (mat_id,))
-                            row = qc.fetchone()
-                            have = row["quantity"] if row else None
-                        if have is None or have < need:
-                            raise ValueError("Insufficient stock for material")
-                        self.cursor.execute(
-                            "UPDATE stock SET quantity = quantity - %s "
-                            "WHERE id_product = %s",
-                            (need, mat_id))
-                added_qty = quantity * recipe["quantity"]
+        # Toate materialele se consumă într-un singur UPDATE (reserve_stock)
+        demands = {int(mid): mqty * quantity for mid, mqty in recipe["materials"].items()}
+        added_qty = quantity * recipe["quantity"]
+
+        def work():
+            if job_ids:
                 self.cursor.execute(
-                    "UPDATE stock SET quantity = quantity + %s "
-                    "WHERE id_product = %s",
-                    (added_qty, recipe_id)
-                )
-                if self.cursor.rowcount == 0:
-                    self.cursor.execute(
-                        """
-                        INSERT INTO stock
-                          (id_product, name, price, description, quantity, type)
-                        VALUES (%s,%s,%s,%s,%s,%s)
-                        """,
-                        (
-                            recipe_id,
-                            recipe["name"],
-                            recipe["price"],
-                            recipe["description"],
-                            added_qty,
-                            recipe["type"]
-                        )
+                    "UPDATE production_jobs SET status='done', error=NULL, finished_at=now() "
+                    "WHERE id_job = ANY(%s) AND status = 'running'",
+                    (list(job_ids),))
+                if self.cursor.rowcount != len(job_ids):
+                    raise JobAlreadyFinished(job_ids)
+            self.reserve_stock(demands)
+            self.cursor.execute(
+                "UPDATE stock SET quantity = quantity + %s "
+                "WHERE id_product = %s",
+                (added_qty, recipe_id)
+            )
+            if self.cursor.rowcount == 0:
+                self.cursor.execute(
+                    """
+                    INSERT INTO stock
+                      (id_product, name, price, description, quantity, type)
+                    VALUES (%s,%s,%s,%s,%s,%s)
+                    """,
+                    (
+                        recipe_id,
+                        recipe["name"],
+                        recipe["price"],
+                        recipe["description"],
+                        added_qty,
+                        recipe["type"]
                     )
-            self.connection.commit()
+                )
+        try:
+            self._run_with_retry(work, sorted(demands))
+            self.notify_stock_change()
             return {"success": True}
         except Exception as exc:
             self.connection.rollback()
             return {"error": str(exc)}
 
+    def enqueue_production_job(self, recipe_id, quantity, employee_id=None):
+        # Pune o cerere de producție în coadă; execuția o face ProductionWorker.
+        try:
+            with self.connection:
+                self.cursor.execute(
+                    "INSERT INTO production_jobs (id_final, quantity, id_employee) "
+                    "VALUES (%s,%s,%s) RETURNING id_job",
+                    (recipe_id, quantity, employee_id))
+                return {"success": True, "job_id": self.cursor.fetchone()["id_job"]}
+        except Exception as exc:
+            return {"error": str(exc)}
+
+    def claim_production_jobs(self, limit, stale_after=600):
+        # Preia până la `limit` joburi în așteptare (SKIP LOCKED, sigur între procese);
+        # joburile rămase 'running' mai mult de stale_after secunde sunt reluate.
+        with self.connection:
+            self.cursor.execute(
+                """
+                UPDATE production_jobs
+                SET status = 'running', started_at = now()
+                WHERE id_job IN (
+                    SELECT id_job FROM production_jobs
+                    WHERE status = 'queued'
+                       OR (status = 'running'
+                           AND started_at < now() - make_interval(secs => %s))
+                    ORDER BY id_job
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT %s)
+                RETURNING id_job, id_final, quantity
+                """,
+                (stale_after, limit))
+            return self.cursor.fetchall()
+
+    def finish_production_jobs(self, job_ids, status, error=None):
+        # Marchează joburile încă 'running' ca 'done' sau 'failed'.
+        with self.connection:
+            self.cursor.execute(
+                "UPDATE production_jobs "
+                "SET status=%s, error=%s, finished_at=now() "
+                "WHERE id_job = ANY(%s) AND status = 'running'",
+                (status, error, list(job_ids)))
+
+    def get_production_job(self, job_id):
+        # Starea unui job de producție.
+        with self._dict_cur() as cur:
+            cur.execute(
+                "SELECT pj.*, s.name AS final_name "
+                "FROM production_jobs pj JOIN stock s ON s.id_product = pj.id_final "
+                "WHERE pj.id_job = %s",
+                (job_id,))
+            return cur.fetchone()
+
     def get_employee_id(self, username):
-        # id-ul angajatului cu un anumit username.
+        # id-ul angajatului cu un anumit username (din cache-ul de identități).
+        return self.identities.get_or_load("employee", username, self._load_employee_id)
+
+    def _load_employee_id(self, username):
         with self._dict_cur() as cur:
             cur.execute(
                 "SELECT id FROM employees WHERE LOWER(username)=LOWER(%s)",
@@ -810,6 +1390,39 @@ class Database:
         )
         return self.cursor.fetchall()
 
+    def _orders_with_totals(self, owner_col, owner_id, limit=None, after=None, stream=False):
+        # Comenzile + cantitatea și valoarea totală, într-o singură interogare.
+        # after = (data, id_order) al ultimei comenzi din pagina anterioară (keyset).
+        sql = f"""
+            SELECT o.*,
+                   COALESCE(SUM(oc.quantity), 0)            AS qty,
+                   COALESCE(SUM(oc.quantity * oc.price), 0) AS total
+            FROM orders o
+            LEFT JOIN order_content oc ON oc.id_order = o.id_order
+            WHERE o.{owner_col} = %s
+        """
+        params = [owner_id]
+        if after is not None:
+            sql += " AND (o.data, o.id_order) < (%s, %s)"
+            params.extend(after)
+        sql += " GROUP BY o.id_order ORDER BY o.data DESC, o.id_order DESC"
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+        if stream:
+            return self._iter_query(sql, tuple(params))
+        with self._dict_cur() as cur:
+            cur.execute(sql, tuple(params))
+            return cur.fetchall()
+
+    def get_orders_with_totals_by_employee(self, emp_id, limit=None, after=None, stream=False):
+        # Comenzile unui angajat, cu totaluri, paginate după (data, id_order).
+        return self._orders_with_totals("id_employee", emp_id, limit, after, stream)
+
+    def get_orders_with_totals_by_customer(self, customer_id, limit=None, after=None):
+        # Comenzile unui client, cu totaluri, paginate după (data, id_order).
+        return self._orders_with_totals("id_client", customer_id, limit, after)
+
     def get_order_items(self, order_id):
         # Articolele dintr-o comandă dată.
         self.cursor.execute(
@@ -823,11 +1436,44 @@ class Database:
         )
         return self.cursor.fetchall()
 
-    def update_order_status(self, emp_username, order_id, status):
-        # Actualizează statusul unei comenzi.
-        emp_id = self.get_employee_id(emp_username)
-        if emp_id is None:
-            return {"error": "Angajat inexistent"}
+    def get_order_detail(self, order_id, emp_id):
+        # Comanda + clientul + articolele + cantitatea totală, într-o singură interogare;
+        # None dacă nu există sau nu aparține angajatului (verificat în SQL).
+        self.cursor.execute(
+            """
+            SELECT o.*,
+                   json_build_object(
+                       'id_customer', c.id_customer, 'name', c.name, 'surname', c.surname,
+                       'email', c.email, 'address', c.address, 'phone_number', c.phone_number
+                   ) AS customer,
+                   COALESCE(it.items, '[]'::json) AS items,
+                   COALESCE(it.qty, 0)            AS qty,
+                   COALESCE(it.total, 0)          AS total
+            FROM orders o
+            JOIN customers c ON c.id_customer = o.id_client
+            LEFT JOIN LATERAL (
+                SELECT json_agg(json_build_object(
+                           'name', s.name, 'quantity', oc.quantity, 'price', oc.price::text
+                       ) ORDER BY oc.id_item)          AS items,
+                       SUM(oc.quantity)                AS qty,
+                       SUM(oc.quantity * oc.price)     AS total
+                FROM order_content oc
+                JOIN stock s ON s.id_product = oc.id_product
+                WHERE oc.id_order = o.id_order
+            ) it ON TRUE
+            WHERE o.id_order = %s AND o.id_employee = %s
+            """,
+            (order_id, emp_id)
+        )
+        order = self.cursor.fetchone()
+        if order:
+            # prețul vine ca text din JSON și redevine Decimal (12.50, nu 12.5)
+            for item in order["items"]:
+                item["price"] = Decimal(item["price"])
+        return order
+
+    def update_order_status(self, emp_id, order_id, status):
+        # Actualizează statusul unei comenzi (doar dacă aparține angajatului emp_id).
         self.cursor.execute(
             "UPDATE orders SET progress=%s "
             "WHERE id_order=%s AND id_employee=%s",
@@ -850,103 +1496,121 @@ class Database:
             id_final = r['id_product'] if r else None
         if id_final is None:
             return {"error": "Produs final inexistent în stock"}
-        if not ingredients or len(ingredients) > 5:
-            return {"error": "Ingrediente trebuie 1-5 articole"}
-        mats: list[tuple[int, int]] = []
+        if not ingredients:
+            return {"error": "Rețeta trebuie să aibă cel puțin un ingredient"}
+        wanted: dict[str, int] = {}
         for item in ingredients:
             nm = item.get("name", "").strip()
             qty = item.get("quantity", 0)
             if not nm or qty < 1:
                 return {"error": f"Ingredient invalid: {item}"}
-            with self._dict_cur() as _c:
-                _c.execute(
-                    "SELECT id_product FROM stock "
-                    "WHERE LOWER(name)=LOWER(%s) AND type<>'final'",
-                    (nm,))
-                _r = _c.fetchone()
-                mid = _r['id_product'] if _r else None
-            if mid is None:
+            wanted[nm.lower()] = wanted.get(nm.lower(), 0) + qty
+        # Toate ingredientele se caută într-o singură interogare
+        with self._dict_cur() as cur:
+            cur.execute(
+                "SELECT id_product, LOWER(name) AS lname FROM stock "
+                "WHERE LOWER(name) = ANY(%s) AND type<>'final'",
+                (list(wanted),))
+            ids = {r['lname']: r['id_product'] for r in cur.fetchall()}
+        for nm in wanted:
+            if nm not in ids:
                 return {"error": f"Materie primă inexistentă: {nm}"}
-            mats.append((mid, qty))
-        while len(mats) < 5:
-            mats.append((None, None))
+        return self.create_recipe(id_final, 1, [(ids[nm], qty) for nm, qty in wanted.items()])
+
+    def create_recipe(self, id_final, quantity, materials):
+        # Inserează rețeta și toate ingredientele ei [(id_material, cantitate), ...].
+        if not materials:
+            return {"error": "Rețeta trebuie să aibă cel puțin un ingredient"}
+        merged: dict[int, int] = {}
+        for mid, mqty in materials:
+            merged[mid] = merged.get(mid, 0) + mqty
         try:
             with self.connection:
-                self.cursor.execute("""
-                    INSERT INTO recipes (
-                        id_final, quantity,
-                        id_material1, quantity_material1,
-                        id_material2, quantity_material2,
-                        id_material3, quantity_material3,
-                        id_material4, quantity_material4,
-                        id_material5, quantity_material5
-                    ) VALUES (%s,1,
-                              %s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                """, (
-                    id_final,
-                    *sum(([mid, qty] for mid, qty in mats), [])
-                ))
-            self.connection.commit()
-            return {"success": True}
+                self.cursor.execute(
+                    "INSERT INTO recipes (id_final, quantity) VALUES (%s,%s) RETURNING id_recipe",
+                    (id_final, quantity))
+                rid = self.cursor.fetchone()["id_recipe"]
+                psycopg2.extras.execute_values(
+                    self.cursor,
+                    "INSERT INTO recipe_ingredients (id_recipe, id_material, quantity) VALUES %s",
+                    [(rid, mid, mqty) for mid, mqty in merged.items()]
+                )
+            return {"success": True, "id_recipe": rid}
         except Exception as exc:
             self.connection.rollback()
             return {"error": str(exc)}
 
+    def _lock_partner_offers(self, offer_ids, stock_ids):
+        # Blochează (FOR UPDATE, în ordinea id-urilor) ofertele date și toate ofertele
+        # cu stoc pentru produsele stock_ids; întoarce rândurile blocate
+        self.cursor.execute(
+            """
+            SELECT id_product, id_stock, id_partner, price, quantity
+            FROM partner_products
+            WHERE id_product = ANY(%s) OR (id_stock = ANY(%s) AND quantity > 0)
+            ORDER BY id_product
+            FOR UPDATE
+            """,
+            (sorted(offer_ids), sorted(stock_ids)))
+        return self.cursor.fetchall()
+
     def create_procurement_orders(self, employee_id, items):
-        # Comenzile de achiziție pentru parteneri.
+        # Comenzile de achiziție pentru parteneri; cantitatea unui produs se poate
+        # împărți între mai mulți furnizori (de la cel mai ieftin în sus).
         if not items:
             return {"error": "Empty item list"}
         if employee_id is None:
             return {"error": "Invalid employee"}
-        parts: dict[int, list[tuple[int, int, float]]] = {}
+        wanted: dict[int, int] = {}
         try:
-            with self._dict_cur() as cur:
-                for sid, qty in items:
-                    if qty <= 0:
-                        return {"error": f"Invalid qty for product {sid}"}
-                    cur.execute(
-                        """
-                        SELECT id_product, id_partner, price, quantity
-                        FROM partner_products
-                        WHERE id_stock=%s
-                        ORDER BY price ASC
-                        LIMIT 1
-                        """,
-                        (sid,))
-                    row = cur.fetchone()
-                    if not row:
-                        return {"error": f"No supplier for product {sid}"}
-                    if row["quantity"] < qty:
-                        return {"error": f"Insufficient supplier stock for {sid}"}
-                    parts.setdefault(row["id_partner"], []).append(
-                        (row["id_product"], qty, row["price"])
-                    )
-        except Exception as exc:
-            return {"error": str(exc)}
+            for sid, qty in items:
+                sid, qty = int(sid), int(qty)
+                if qty <= 0:
+                    return {"error": f"Invalid qty for product {sid}"}
+                wanted[sid] = wanted.get(sid, 0) + qty
+        except (TypeError, ValueError):
+            return {"error": "Invalid item list"}
         try:
             with self.connection:
-                created = []
+                # Calea rapidă: cea mai ieftină ofertă (partner_best_offers) acoperă singură
+                # cantitatea; doar restul produselor citesc toate ofertele, pentru împărțire
+                best = {o["id_stock"]: o for o in self.get_best_partner_offers(wanted, top_k=1)}
+                single = {sid for sid, qty in wanted.items()
+                          if sid in best and best[sid]["partner_quantity"] >= qty}
+                offers = self._lock_partner_offers(
+                    [best[sid]["id_offer"] for sid in single], set(wanted) - single)
+                lines, shortages = sourcing.allocate(wanted, offers)
+                if shortages.keys() & single:
+                    # oferta s-a schimbat între citire și lock: se împarte și pentru acestea
+                    more = self._lock_partner_offers([], shortages.keys() & single)
+                    seen = {o["id_product"] for o in offers}
+                    offers += [o for o in more if o["id_product"] not in seen]
+                    lines, shortages = sourcing.allocate(wanted, offers)
+                if shortages:
+                    sid = min(shortages)
+                    if not any(o["id_stock"] == sid for o in offers):
+                        raise ValueError(f"No supplier for product {sid}")
+                    raise ValueError(f"Insufficient supplier stock for {sid}")
                 now = datetime.utcnow()
-                for partner_id, lst in parts.items():
-                    self.cursor.execute(
-                        """
-                        INSERT INTO partner_orders
-                          (id_partner, data, status, id_employee)
-                        VALUES (%s,%s,'pending',%s)
-                        RETURNING id_order
-                        """,
-                        (partner_id, now, employee_id))
-                    oid = self.cursor.fetchone()["id_order"]
-                    self.cursor.executemany(
-                        """
-                        INSERT INTO partner_order_content
-                          (id_product, id_order, quantity, price)
-                        VALUES (%s,%s,%s,%s)
-                        """,
-                        [(ppid, oid, qty, price) for ppid, qty, price in lst]
-                    )
-                    created.append(oid)
-            return {"success": True, "orders": created}
+                partner_ids = sorted(lines)
+                # Un singur INSERT pentru toate antetele de comandă...
+                rows = psycopg2.extras.execute_values(
+                    self.cursor,
+                    "INSERT INTO partner_orders (id_partner, data, status, id_employee) "
+                    "VALUES %s RETURNING id_order, id_partner",
+                    [(pid, now, "pending", employee_id) for pid in partner_ids],
+                    fetch=True
+                )
+                order_of = {r["id_partner"]: r["id_order"] for r in rows}
+                # ...și unul pentru toate liniile
+                psycopg2.extras.execute_values(
+                    self.cursor,
+                    "INSERT INTO partner_order_content (id_product, id_order, quantity, price) "
+                    "VALUES %s",
+                    [(ppid, order_of[pid], qty, price)
+                     for pid in partner_ids for ppid, qty, price in lines[pid]]
+                )
+            return {"success": True, "orders": [order_of[pid] for pid in partner_ids]}
         except Exception as exc:
             self.connection.rollback()
             return {"error": str(exc)}
@@ -978,6 +1642,8 @@ class Database:
             self.connection.rollback()
             return {"error": "Comandă inexistentă sau nu vă aparține"}
         self.connection.commit()
+        if status == 'completed':
+            self.notify_stock_change()
         return {"success": True}
 
     def place_order(self, customer_id, items):
@@ -1005,32 +1671,50 @@ class Database:
             emp_id = row["id"] if row else None
         if emp_id is None:
             return {"error": "Nu există angajați vânzări"}
+        product_ids = sorted({pid for pid, _ in clean_items})
+        demand = {}
+        for pid, qty in clean_items:
+            demand[pid] = demand.get(pid, 0) + qty
+
+        def work():
+            # Blocăm rândurile din stock în ordinea id-urilor, ca două comenzi
+            # concurente să nu se blocheze reciproc (deadlock)
+            started = time.perf_counter()
+            self.cursor.execute(
+                "SELECT id_product, price, quantity FROM stock "
+                "WHERE id_product = ANY(%s) "
+                "ORDER BY id_product FOR UPDATE",
+                (product_ids,)
+            )
+            locked = {r["id_product"]: r for r in self.cursor.fetchall()}
+            self._record_contention(
+                product_ids, "lock_wait_ms", (time.perf_counter() - started) * 1000)
+            missing = [pid for pid in product_ids if pid not in locked]
+            if missing:
+                raise ValueError(f"Produs inexistent ID {missing[0]}")
+            short = [pid for pid in product_ids if locked[pid]["quantity"] < demand[pid]]
+            if short:
+                self._record_contention(short, "insufficient")
+                raise InsufficientStock(short)
+            self.cursor.execute(
+                "INSERT INTO orders (id_client,data,progress,id_employee) "
+                "VALUES (%s,%s,'pending',%s) RETURNING id_order",
+                (customer_id, datetime.utcnow(), emp_id)
+            )
+            oid = self.cursor.fetchone()["id_order"]
+            # Toate liniile într-o singură instrucțiune; trigger-ul de stoc rulează o dată
+            psycopg2.extras.execute_values(
+                self.cursor,
+                "INSERT INTO order_content "
+                "(id_order,id_product,quantity,price) VALUES %s",
+                [(oid, pid, qty, locked[pid]["price"]) for pid, qty in clean_items],
+                page_size=len(clean_items)
+            )
+            self._record_contention(product_ids, "reserved")
+            return oid
         try:
-            from datetime import datetime
-            now = datetime.utcnow()
-            with self.connection:
-                self.cursor.execute(
-                    "INSERT INTO orders (id_client,data,progress,id_employee) "
-                    "VALUES (%s,%s,'pending',%s) RETURNING id_order",
-                    (customer_id, now, emp_id)
-                )
-                oid = self.cursor.fetchone()["id_order"]
-                for pid, qty in clean_items:
-                    price = None
-                    with self._dict_cur() as pcur:
-                        pcur.execute("SELECT price FROM stock WHERE id_product=%s",
-                                     (pid,))
-                        prow = pcur.fetchone()
-                        price = prow["price"] if prow else None
-                    if price is None:
-                        raise ValueError(f"Produs inexistent ID {pid}")
-                    self.cursor.execute(
-                        "INSERT INTO order_content "
-                        "(id_order,id_product,quantity,price) "
-                        "VALUES (%s,%s,%s,%s)",
-                        (oid, pid, qty, price)
-                    )
-            self.connection.commit()
+            oid = self._run_with_retry(work, product_ids)
+            self.notify_stock_change()
             return {"success": True, "order_id": oid}
         except Exception as exc:
             self.connection.rollback()
@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+
+class IdentityCache:
+    """Cache LRU username -> id numeric, pe rol (customer / employee / partner).
+
+    Id-urile nu se schimbă pentru un username dat, deci intrările nu expiră;
+    se scot doar la modificări de cont (invalidate) sau când cache-ul e plin.
+    Rezultatele None (cont inexistent) nu se păstrează.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, role, username, loader):
+        if not username:
+            return None  # formular / sesiune fără username: niciun cont
+        key = (role, username.lower())
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        value = loader(username)
+        if value is not None:
+            with self._lock:
+                self._data[key] = value
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, role=None, username=None):
+        # Fără argumente golește tot; doar role -> toate conturile rolului
+        with self._lock:
+            if role is None:
+                self._data.clear()
+            elif username is None:
+                for key in [k for k in self._data if k[0] == role]:
+                    del self._data[key]
+            elif username:
+                self._data.pop((role, username.lower()), None)
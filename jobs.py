@@ -0,0 +1,91 @@
+import os
+import threading
+import traceback
+
+from db import Database
+
+
+class ProductionWorker:
+    """Pool de fire care execută joburile din tabela production_jobs.
+
+    Joburile preluate împreună sunt grupate pe rețetă și produse cu un singur
+    apel produce_product (o singură rezervare de materiale per rețetă).
+    """
+
+    def __init__(self, db, workers=None, batch_size=None, poll_interval=None):
+        self.db = db
+        self.workers = int(workers if workers is not None else os.getenv("PRODUCTION_WORKERS") or 2)
+        self.batch_size = int(batch_size or os.getenv("PRODUCTION_BATCH_SIZE") or 50)
+        self.poll_interval = float(poll_interval or os.getenv("PRODUCTION_POLL_INTERVAL") or 2)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        # Pornește firele de lucru (o singură dată)
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._loop, name=f"production-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def wake(self):
+        # Apelat după enqueue, ca jobul să nu aștepte următorul poll
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception:
+                traceback.print_exc()
+                processed = 0
+            if not processed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_once(self):
+        # Preia un lot de joburi și le execută; întoarce numărul de joburi procesate
+        try:
+            jobs = self.db.claim_production_jobs(self.batch_size)
+            by_recipe = {}
+            for job in jobs:
+                by_recipe.setdefault(job["id_final"], []).append(job)
+            for recipe_id, group in by_recipe.items():
+                self._produce(recipe_id, group)
+            return len(jobs)
+        finally:
+            self.db.release()
+
+    def _produce(self, recipe_id, group):
+        total = sum(j["quantity"] for j in group)
+        # Joburile sunt marcate 'done' în tranzacția producției
+        res = self.db.produce_product(recipe_id, total, [j["id_job"] for j in group])
+        if res.get("success"):
+            return
+        if len(group) == 1:
+            self.db.finish_production_jobs([group[0]["id_job"]], "failed", res.get("error"))
+            return
+        # Lotul nu încape în stoc: încercăm joburile pe rând, ca cele care încap să reușească
+        for job in group:
+            self._produce(recipe_id, [job])
+
+
+if __name__ == '__main__':
+    # Rulare ca proces separat: python jobs.py (cu PRODUCTION_WORKERS=0 în aplicația web)
+    worker = ProductionWorker(Database())
+    worker.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,230 @@
+"""Instrumentare pentru Database: timp pe metodă și pe interogare, în format Prometheus.
+
+QueryMetrics învelește fiecare metodă publică a unei instanțe Database și
+fiecare cursor.execute (prin cursor_factory), agregă histograme de latență,
+numărul de rânduri și amprenta (fingerprint) interogării, iar interogările
+peste DB_SLOW_QUERY_MS sunt scrise în logger-ul "db.slow" împreună cu ruta
+Flask care le-a generat.
+"""
+import functools
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+import psycopg2.extras
+
+slow_log = logging.getLogger("db.slow")
+
+# Limitele histogramelor, în secunde
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"(\((?:\?|%s)(?:\s*,\s*(?:\?|%s))*\))(?:\s*,\s*\((?:\?|%s)(?:\s*,\s*(?:\?|%s))*\))+")
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def normalize(sql):
+    # Textul interogării fără comentarii, literali și liste VALUES repetate
+    sql = _COMMENTS.sub(" ", sql)
+    sql = _LITERALS.sub("?", sql)
+    sql = _VALUE_LISTS.sub(r"\1, ...", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    # (amprentă scurtă, text normalizat); aceeași pentru interogări ce diferă doar prin valori
+    text = normalize(sql)
+    return hashlib.sha1(text.encode()).hexdigest()[:12], text
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{name}_bucket{_labels(labels, le=le)} {cumulative}"
+        yield f"{name}_sum{_labels(labels)} {self.sum}"
+        yield f"{name}_count{_labels(labels)} {self.count}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class InstrumentedCursor(psycopg2.extras.RealDictCursor):
+    # RealDictCursor care raportează fiecare execute către QueryMetrics
+    metrics = None
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self.metrics.observe_query(self, query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self.metrics.observe_query(self, query, time.perf_counter() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self.metrics.observe_query(self, sql, time.perf_counter() - start)
+
+
+class QueryMetrics:
+    """Agregator de latențe pentru metodele Database și interogările lor."""
+
+    def __init__(self, slow_ms=None, route=None):
+        self.slow_ms = float(slow_ms if slow_ms is not None else os.getenv("DB_SLOW_QUERY_MS") or 250)
+        # Funcție care întoarce ruta curentă (setată de app.py); None în afara unui request
+        self.route = route or (lambda: None)
+        self.cursor_factory = type("InstrumentedCursor", (InstrumentedCursor,), {"metrics": self})
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.methods = {}       # metodă -> Histogram
+        self.method_errors = {}  # metodă -> număr de excepții
+        self.queries = {}       # (fingerprint, metodă) -> Histogram
+        self.query_rows = {}    # (fingerprint, metodă) -> rânduri
+        self.statements = {}    # fingerprint -> text normalizat
+        self.slow = {}          # (fingerprint, metodă) -> interogări lente
+        # Funcții apelate după fiecare interogare cu (durată, metodă, amprentă), ex. profiler-ul
+        self.query_listeners = []
+
+    def instrument(self, db):
+        # Învelește metodele publice ale instanței; proprietățile și metodele _private rămân neatinse
+        names = {name: attr for klass in reversed(type(db).__mro__) for name, attr in vars(klass).items()}
+        for name, attr in names.items():
+            if name.startswith("_") or not callable(attr) or isinstance(attr, (staticmethod, classmethod)):
+                continue
+            setattr(db, name, self._wrap(name, getattr(db, name)))
+        return db
+
+    def on_query(self, listener):
+        self.query_listeners.append(listener)
+
+    def _wrap(self, name, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            stack = self._stack()
+            stack.append(name)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.method_errors[name] = self.method_errors.get(name, 0) + 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                with self._lock:
+                    self.methods.setdefault(name, Histogram()).observe(elapsed)
+        return timed
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def observe_query(self, cursor, query, elapsed):
+        if isinstance(query, bytes):
+            query = query.decode(errors="replace")
+        elif not isinstance(query, str):
+            query = query.as_string(cursor)
+        fp, text = fingerprint(query)
+        stack = self._stack()
+        method = stack[-1] if stack else ""
+        rows = max(cursor.rowcount, 0)
+        key = (fp, method)
+        slow = elapsed * 1000 >= self.slow_ms
+        with self._lock:
+            self.statements.setdefault(fp, text)
+            self.queries.setdefault(key, Histogram()).observe(elapsed)
+            self.query_rows[key] = self.query_rows.get(key, 0) + rows
+            if slow:
+                self.slow[key] = self.slow.get(key, 0) + 1
+        if slow:
+            slow_log.warning(
+                "slow query %.1f ms route=%s method=%s rows=%d fingerprint=%s: %s",
+                elapsed * 1000, self.route(), method or "-", rows, fp, text)
+        for listener in self.query_listeners:
+            listener(elapsed, method, fp)
+
+    def render(self):
+        # Toate metricile în formatul text Prometheus (expoziție 0.0.4)
+        with self._lock:
+            methods = {k: (h, self.method_errors.get(k, 0)) for k, h in self.methods.items()}
+            queries = dict(self.queries)
+            rows = dict(self.query_rows)
+            slow = dict(self.slow)
+            statements = dict(self.statements)
+        out = [
+            "# HELP db_method_duration_seconds Durata apelurilor metodelor Database.",
+            "# TYPE db_method_duration_seconds histogram",
+        ]
+        for name, (hist, _) in sorted(methods.items()):
+            out.extend(hist.lines("db_method_duration_seconds", {"method": name}))
+        out += [
+            "# HELP db_method_errors_total Excepții ieșite din metodele Database.",
+            "# TYPE db_method_errors_total counter",
+        ]
+        out += [f"db_method_errors_total{_labels({'method': name})} {errors}"
+                for name, (_, errors) in sorted(methods.items())]
+        out += [
+            "# HELP db_query_duration_seconds Durata cursor.execute, pe amprentă și metodă.",
+            "# TYPE db_query_duration_seconds histogram",
+        ]
+        for (fp, method), hist in sorted(queries.items()):
+            out.extend(hist.lines("db_query_duration_seconds", {"fingerprint": fp, "method": method}))
+        out += [
+            "# HELP db_query_rows_total Rânduri întoarse sau modificate, pe amprentă și metodă.",
+            "# TYPE db_query_rows_total counter",
+        ]
+        out += [f"db_query_rows_total{_labels({'fingerprint': fp, 'method': method})} {n}"
+                for (fp, method), n in sorted(rows.items())]
+        out += [
+            "# HELP db_slow_queries_total Interogări peste pragul DB_SLOW_QUERY_MS.",
+            "# TYPE db_slow_queries_total counter",
+        ]
+        out += [f"db_slow_queries_total{_labels({'fingerprint': fp, 'method': method})} {n}"
+                for (fp, method), n in sorted(slow.items())]
+        out += [
+            "# HELP db_query_info Textul normalizat al fiecărei amprente.",
+            "# TYPE db_query_info gauge",
+        ]
+        out += [f"db_query_info{_labels({'fingerprint': fp, 'statement': text[:500]})} 1"
+                for fp, text in sorted(statements.items())]
+        return "\n".join(out) + "\n"
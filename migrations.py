@@ -0,0 +1,213 @@
+"""Migrări de schemă versionate, înregistrate în tabela schema_version.
+
+Rulare: python migrations.py [status|apply]
+Workerii web pot porni cu DB_SCHEMA_MODE=verify: verifică doar versiunea și
+nu mai rulează DDL (care ia lock-uri exclusive pe tabelele folosite).
+"""
+import sys
+
+import analytics
+
+# Cheia lock-ului advisory care serializează rularea migrărilor între procese
+SCHEMA_LOCK_KEY = 72710012
+
+# (versiune, descriere, pas); pasul e fie un SQL, fie o funcție care primește Database.
+# Pașii nu fac commit: rulează în tranzacția care înregistrează și versiunea.
+# O funcție care întoarce False nu e înregistrată ca aplicată și se reîncearcă la
+# următorul apply (doar pentru migrările din OPTIONAL, ex. extensii lipsă).
+# Migrările existente nu se modifică; schimbările noi se adaugă la final.
+MIGRATIONS = [
+    (1, "tabele de bază", lambda db: db.create_tables(commit=False)),
+    (2, "indecși pentru căutări", lambda db: db.create_indexes(commit=False)),
+    (3, "trigger-e de stoc", lambda db: db.create_triggers(commit=False)),
+    (4, "date de test", lambda db: db.generate_dummy_data(commit=False)),
+    (5, "un singur rând per (partener, produs) în partner_products", """
+        -- Duplicatele se contopesc în rândul cu id-ul cel mai mic (comenzile sunt mutate pe el);
+        -- cantitățile duplicatelor se adună în rândul păstrat, iar prețul rămas e cel mai mic
+        -- dintre oferte (liniile de comandă își păstrează prețul propriu)
+        CREATE TEMP TABLE pp_dupes ON COMMIT DROP AS
+        SELECT id_product,
+               MIN(id_product) OVER (PARTITION BY id_partner, id_stock) AS keep
+        FROM partner_products;
+        DELETE FROM pp_dupes WHERE id_product = keep;
+        UPDATE partner_products k
+        SET quantity = k.quantity + s.q, price = LEAST(k.price, s.min_price)
+        FROM (SELECT d.keep, SUM(pp.quantity) AS q, MIN(pp.price) AS min_price
+              FROM pp_dupes d JOIN partner_products pp USING (id_product)
+              GROUP BY d.keep) s
+        WHERE k.id_product = s.keep;
+        UPDATE partner_order_content poc SET id_product = d.keep
+        FROM pp_dupes d WHERE poc.id_product = d.id_product;
+        DELETE FROM partner_products pp USING pp_dupes d WHERE pp.id_product = d.id_product;
+        ALTER TABLE partner_products
+            ADD CONSTRAINT partner_products_partner_stock_key UNIQUE (id_partner, id_stock);
+    """),
+    (6, "cele mai bune oferte per produs, întreținute prin trigger", """
+        -- Primele 3 oferte (după preț) pentru fiecare produs din stoc
+        CREATE TABLE IF NOT EXISTS partner_best_offers (
+            id_stock INTEGER NOT NULL REFERENCES stock(id_product) ON DELETE CASCADE,
+            rank SMALLINT NOT NULL,
+            id_offer INTEGER NOT NULL REFERENCES partner_products(id_product) ON DELETE CASCADE,
+            id_partner INTEGER NOT NULL REFERENCES partners(id_partner),
+            price NUMERIC(10,2) NOT NULL,
+            PRIMARY KEY (id_stock, rank)
+        );
+        CREATE OR REPLACE FUNCTION refresh_partner_best_offers(ids INTEGER[]) RETURNS VOID
+        LANGUAGE sql AS $$
+            -- lock per produs, în ordine, ca două reîmprospătări concurente să nu se suprapună
+            SELECT pg_advisory_xact_lock(7271, id) FROM unnest(ids) AS id ORDER BY id;
+            DELETE FROM partner_best_offers WHERE id_stock = ANY(ids);
+            INSERT INTO partner_best_offers (id_stock, rank, id_offer, id_partner, price)
+            SELECT id_stock, rn, id_product, id_partner, price
+            FROM (
+                SELECT pp.*,
+                       ROW_NUMBER() OVER (PARTITION BY id_stock ORDER BY price, id_product) AS rn
+                FROM partner_products pp
+                WHERE id_stock = ANY(ids)
+            ) ranked
+            WHERE rn <= 3;
+        $$;
+        CREATE OR REPLACE FUNCTION trg_partner_products_best_offers_fn() RETURNS TRIGGER
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            ids INTEGER[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                ids := ARRAY(SELECT DISTINCT id_stock FROM new_rows);
+            ELSIF TG_OP = 'DELETE' THEN
+                ids := ARRAY(SELECT DISTINCT id_stock FROM old_rows);
+            ELSE
+                -- schimbările doar de cantitate nu afectează clasamentul
+                ids := ARRAY(
+                    SELECT o.id_stock FROM old_rows o JOIN new_rows n USING (id_product)
+                    WHERE (o.price, o.id_stock, o.id_partner) IS DISTINCT FROM (n.price, n.id_stock, n.id_partner)
+                    UNION
+                    SELECT n.id_stock FROM old_rows o JOIN new_rows n USING (id_product)
+                    WHERE (o.price, o.id_stock, o.id_partner) IS DISTINCT FROM (n.price, n.id_stock, n.id_partner));
+            END IF;
+            IF cardinality(ids) > 0 THEN
+                PERFORM refresh_partner_best_offers(ids);
+            END IF;
+            RETURN NULL;
+        END; $$;
+        CREATE TRIGGER trg_partner_products_best_offers_ins AFTER INSERT ON partner_products
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION trg_partner_products_best_offers_fn();
+        CREATE TRIGGER trg_partner_products_best_offers_upd AFTER UPDATE ON partner_products
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION trg_partner_products_best_offers_fn();
+        CREATE TRIGGER trg_partner_products_best_offers_del AFTER DELETE ON partner_products
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION trg_partner_products_best_offers_fn();
+        SELECT refresh_partner_best_offers(ARRAY(SELECT id_product FROM stock));
+    """),
+    (7, "index trigram (pg_trgm) pentru căutarea de produse", lambda db: db.create_search_index()),
+    (8, "agregate zilnice de vânzări pentru rapoarte", analytics.SCHEMA + analytics.REBUILD_TOTALS),
+    (9, "agregatele urmăresc și editările din order_content",
+     analytics.CONTENT_UPDATE + analytics.REBUILD_TOTALS),
+    (10, "trigger-ele de vânzări scriu într-un jurnal, compactat separat",
+     analytics.LOG_SCHEMA + analytics.REBUILD),
+]
+
+
+# Migrări fără de care aplicația pornește (are alternativă); verify nu le cere
+OPTIONAL = {7}
+
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+
+def applied_versions(db):
+    # Mulțimea versiunilor înregistrate în schema_version
+    with db.connection:
+        db.cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL AS present")
+        if not db.cursor.fetchone()["present"]:
+            return set()
+        db.cursor.execute("SELECT version FROM schema_version")
+        return {r["version"] for r in db.cursor.fetchall()}
+
+
+def missing_versions(db, required_only=False):
+    done = applied_versions(db)
+    return [v for v, _, _ in MIGRATIONS
+            if v not in done and not (required_only and v in OPTIONAL)]
+
+
+def current_version(db):
+    # Versiunea aplicată; 0 dacă schema_version nu există încă
+    with db.connection:
+        db.cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL AS present")
+        if not db.cursor.fetchone()["present"]:
+            return 0
+        db.cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+        return db.cursor.fetchone()["version"]
+
+
+def verify(db):
+    # Pornire rapidă: o singură interogare, fără DDL
+    missing = missing_versions(db, required_only=True)
+    if missing:
+        raise RuntimeError(
+            f"Lipsesc migrările {', '.join(map(str, missing))} (codul cere {latest_version()}); "
+            "rulați: python migrations.py apply")
+
+
+def apply(db):
+    # Aplică în ordine migrările lipsă; întoarce versiunile aplicate
+    with db.connection:
+        db.cursor.execute("SELECT pg_advisory_lock(%s)", (SCHEMA_LOCK_KEY,))
+    try:
+        with db.connection:
+            db.cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """)
+        done = applied_versions(db)
+        applied = []
+        for version, description, step in MIGRATIONS:
+            if version in done:
+                continue
+            with db.connection:
+                if callable(step):
+                    if step(db) is False and version in OPTIONAL:
+                        continue  # amânată; nu se înregistrează
+                else:
+                    db.cursor.execute(step)
+                db.cursor.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s,%s)",
+                    (version, description))
+            applied.append(version)
+        return applied
+    finally:
+        with db.connection:
+            db.cursor.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_LOCK_KEY,))
+
+
+def main(argv):
+    from db import Database
+
+    command = argv[0] if argv else "status"
+    db = Database(schema_mode="skip")
+    try:
+        if command == "apply":
+            applied = apply(db)
+            print("Migrări aplicate:", ", ".join(map(str, applied)) or "niciuna")
+        elif command == "status":
+            missing = missing_versions(db)
+            print(f"Versiune curentă: {current_version(db)}, ultima: {latest_version()}"
+                  + (f", neaplicate: {', '.join(map(str, missing))}" if missing else ""))
+        else:
+            print(__doc__)
+            return 2
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+import math
+from collections import deque
+
+
+class BOMCycleError(ValueError):
+    pass
+
+
+def plan_requirements(demand, bom, stock, on_order, offers):
+    """Explozie MRP multi-nivel într-o singură trecere.
+
+    demand   {id_product: cantitate cerută}
+    bom      {id_final: (randament, {id_material: cantitate pe lot})}
+    stock    {id_product: rând din stock (name, quantity, ...)}
+    on_order {id_product: cantitate comandată la parteneri, nelivrată}
+    offers   {id_product: cea mai ieftină ofertă (id_partner, partner_name, partner_price)}
+
+    Produsele sunt parcurse în ordine topologică (părinții înaintea
+    ingredientelor), așa că fiecare necesar brut e complet înainte de netare.
+    """
+    # Doar nodurile care pot fi atinse din cerere
+    reachable = set()
+    todo = [pid for pid, qty in demand.items() if qty > 0]
+    while todo:
+        pid = todo.pop()
+        if pid in reachable:
+            continue
+        reachable.add(pid)
+        if pid in bom:
+            todo.extend(bom[pid][1])
+
+    indegree = {pid: 0 for pid in reachable}
+    for pid in reachable:
+        for mid in bom.get(pid, (1, {}))[1]:
+            indegree[mid] += 1
+    queue = deque(pid for pid, deg in indegree.items() if deg == 0)
+    order = []
+    while queue:
+        pid = queue.popleft()
+        order.append(pid)
+        for mid in bom.get(pid, (1, {}))[1]:
+            indegree[mid] -= 1
+            if indegree[mid] == 0:
+                queue.append(mid)
+    if len(order) != len(reachable):
+        raise BOMCycleError("Rețetele conțin un ciclu")
+
+    gross = {pid: qty for pid, qty in demand.items() if qty > 0}
+    production, purchases = [], []
+    for pid in order:
+        need = gross.get(pid, 0)
+        row = stock.get(pid, {})
+        on_hand = row.get("quantity", 0)
+        incoming = on_order.get(pid, 0)
+        net = max(need - on_hand - incoming, 0)
+        entry = {
+            "id_product": pid,
+            "name": row.get("name", f"ID {pid}"),
+            "gross": need,
+            "on_hand": on_hand,
+            "on_order": incoming,
+            "net": net,
+        }
+        if pid in bom:
+            yield_qty, materials = bom[pid]
+            batches = math.ceil(net / yield_qty) if net else 0
+            for mid, per_batch in materials.items():
+                gross[mid] = gross.get(mid, 0) + per_batch * batches
+            entry["batches"] = batches
+            production.append(entry)
+        elif net:
+            offer = offers.get(pid) or {}
+            price = offer.get("partner_price")
+            entry.update({
+                "id_partner": offer.get("id_partner"),
+                "partner_name": offer.get("partner_name"),
+                "price": price,
+                "cost": price * net if price is not None else None,
+            })
+            purchases.append(entry)
+    return {"production": production, "purchases": purchases}
+
+
+def run_mrp(db, demand):
+    # Citește rețetele, stocul, comenzile deschise și ofertele (4 interogări) și rulează planificarea
+    bom = {
+        row["id_final"]: (row["quantity"], {int(k): v for k, v in row["materials"].items()})
+        for row in db.get_bom()
+    }
+    stock = {row["id_product"]: row for row in db.get_stock(final_only=False)}
+    on_order = {row["id_product"]: row["quantity"] for row in db.get_open_partner_quantities()}
+    offers = {
+        row["id_product"]: row
+        for row in db.get_cheapest_partner_offer()
+        if row["partner_price"] is not None
+    }
+    return plan_requirements(demand, bom, stock, on_order, offers)
@@ -0,0 +1,141 @@
+"""Parole hash-uite cu scrypt, verificate pe un pool dedicat și limitat.
+
+Format stocat: scrypt$n$r$p$salt$hash (salt și hash în base64). Parolele
+vechi, în clar, sunt acceptate la login și rescrise imediat ca hash
+(rehash-on-login); la fel hash-urile cu parametri mai slabi decât cei curenți.
+
+Calculul scrypt e CPU-bound, așa că rulează pe un ThreadPoolExecutor separat
+de firele Flask, cu o coadă limitată (PasswordPoolBusy când e plină) și cu o
+limită de încercări pe username (LoginThrottled).
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+PREFIX = "scrypt$"
+
+
+class PasswordPoolBusy(Exception):
+    # Prea multe verificări în așteptare; clientul trebuie să reîncerce mai târziu
+    pass
+
+
+class LoginThrottled(Exception):
+    # Prea multe încercări de login pentru același username în fereastra curentă
+    def __init__(self, retry_after):
+        super().__init__(f"Prea multe încercări; reîncercați în {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode()
+
+
+def hash_password(password, n=None, r=8, p=1):
+    n = n or int(os.getenv("PASSWORD_SCRYPT_N") or 2 ** 14)
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                            maxmem=256 * n * r + 2 ** 20)
+    return f"{PREFIX}{n}${r}${p}${_b64(salt)}${_b64(digest)}"
+
+
+def check_password(stored, password, legacy_casefold=False):
+    # (parolă corectă, trebuie rehash); legacy_casefold păstrează comparația veche
+    # case-insensitive a partenerilor doar pentru parolele încă în clar
+    if not stored:
+        return False, False
+    if not stored.startswith(PREFIX):
+        if legacy_casefold:
+            ok = hmac.compare_digest(stored.lower().encode(), password.lower().encode())
+        else:
+            ok = hmac.compare_digest(stored.encode(), password.encode())
+        return ok, ok
+    try:
+        n, r, p, salt, digest = stored[len(PREFIX):].split("$")
+        n, r, p = int(n), int(r), int(p)
+        expected = base64.b64decode(digest)
+        actual = hashlib.scrypt(password.encode(), salt=base64.b64decode(salt), n=n, r=r, p=p,
+                                maxmem=256 * n * r + 2 ** 20, dklen=len(expected))
+    except ValueError:
+        return False, False
+    ok = hmac.compare_digest(actual, expected)
+    wanted_n = int(os.getenv("PASSWORD_SCRYPT_N") or 2 ** 14)
+    return ok, ok and n < wanted_n
+
+
+def check_and_rehash(stored, password, legacy_casefold=False):
+    # (ok, hash nou sau None), într-un singur task pe pool
+    ok, rehash = check_password(stored, password, legacy_casefold)
+    return ok, (hash_password(password) if rehash else None)
+
+
+class PasswordService:
+    """Pool de fire pentru hash/verificare, cu coadă limitată și rate limit pe username."""
+
+    def __init__(self, workers=None, max_pending=None, wait_timeout=None,
+                 rate_limit=None, rate_window=None):
+        self.workers = int(workers or os.getenv("PASSWORD_WORKERS") or os.cpu_count() or 2)
+        self.max_pending = int(max_pending or os.getenv("PASSWORD_MAX_PENDING") or self.workers * 4)
+        self.wait_timeout = float(wait_timeout or os.getenv("PASSWORD_WAIT_TIMEOUT") or 10)
+        self.rate_limit = int(rate_limit or os.getenv("LOGIN_RATE_LIMIT") or 10)
+        self.rate_window = float(rate_window or os.getenv("LOGIN_RATE_WINDOW") or 60)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._attempts = {}  # (rol, username) -> deque[momentul încercării]
+        # Hash de comparat pentru username-uri inexistente, ca timpul de răspuns să nu le trădeze
+        self._dummy = hash_password(_b64(os.urandom(12)))
+
+    def _run(self, fn, *args):
+        # Rulează fn pe pool și așteaptă rezultatul; refuză imediat dacă coada e plină
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy("Serviciul de autentificare este ocupat")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.wait_timeout)
+        except FutureTimeout:
+            # Sarcina rămâne în coadă și își eliberează locul când se termină
+            raise PasswordPoolBusy("Serviciul de autentificare este ocupat") from None
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def check(self, stored, password, legacy_casefold=False):
+        # (ok, hash nou sau None); stored=None verifică un hash fictiv și întoarce mereu False
+        if stored is None:
+            self._run(check_password, self._dummy, password)
+            return False, None
+        return self._run(check_and_rehash, stored, password, legacy_casefold)
+
+    def throttle(self, role, username):
+        # Înregistrează o încercare; LoginThrottled dacă s-a depășit limita în fereastră
+        now = time.monotonic()
+        key = (role, username.lower())
+        with self._lock:
+            attempts = self._attempts.get(key)
+            if attempts is None:
+                if len(self._attempts) > 10000:
+                    self._prune(now)
+                attempts = self._attempts[key] = deque()
+            while attempts and attempts[0] <= now - self.rate_window:
+                attempts.popleft()
+            if len(attempts) >= self.rate_limit:
+                raise LoginThrottled(attempts[0] + self.rate_window - now)
+            attempts.append(now)
+
+    def _prune(self, now):
+        for key in [k for k, a in self._attempts.items() if not a or a[-1] <= now - self.rate_window]:
+            del self._attempts[key]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,128 @@
+"""Profiler opțional pe request, cu agregare p50/p95/p99 pe rută.
+
+Un request e profilat dacă are header-ul X-Profile: 1 sau dacă intră în
+eșantionul PROFILE_SAMPLE_RATE (0..1, implicit 0 = doar la cerere). Pentru
+fiecare request profilat se măsoară timpul total, timpul petrecut în baza de
+date și numărul de interogări (prin QueryMetrics) și timpul de randare a
+șabloanelor; răspunsul primește și un header Server-Timing.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from flask import before_render_template, g, has_app_context, request, template_rendered
+
+
+def percentile(values, p):
+    # Percentila p (0..100) prin metoda rangului cel mai apropiat; values e sortată
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+class Profile:
+    # Măsurătorile unui singur request
+    __slots__ = ("start", "db_time", "queries", "render_time", "render_start")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.render_time = 0.0
+        self.render_start = None
+
+
+class RequestProfiler:
+    """Colectează profilele request-urilor și le agregă pe rută (ultimele `window`)."""
+
+    def __init__(self, app=None, metrics=None, sample_rate=None, window=None):
+        self.sample_rate = float(sample_rate if sample_rate is not None
+                                 else os.getenv("PROFILE_SAMPLE_RATE") or 0)
+        self.window = int(window or os.getenv("PROFILE_WINDOW") or 1000)
+        self._lock = threading.Lock()
+        self.samples = {}  # "METODĂ /rută" -> deque[(wall, db, queries, render)]
+        if metrics is not None:
+            metrics.on_query(self._on_query)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._render_start, app)
+        template_rendered.connect(self._render_end, app)
+
+    def _start(self):
+        if request.headers.get("X-Profile") == "1" or random.random() < self.sample_rate:
+            g.profile = Profile()
+
+    @staticmethod
+    def _current():
+        return g.get("profile") if has_app_context() else None
+
+    def _on_query(self, elapsed, method, fingerprint):
+        prof = self._current()
+        if prof is not None:
+            prof.db_time += elapsed
+            prof.queries += 1
+
+    def _render_start(self, sender, template, context, **extra):
+        prof = self._current()
+        if prof is not None:
+            prof.render_start = time.perf_counter()
+
+    def _render_end(self, sender, template, context, **extra):
+        prof = self._current()
+        if prof is not None and prof.render_start is not None:
+            prof.render_time += time.perf_counter() - prof.render_start
+            prof.render_start = None
+
+    def _finish(self, response):
+        prof = g.pop("profile", None)
+        if prof is None:
+            return response
+        wall = time.perf_counter() - prof.start
+        route = f"{request.method} {request.url_rule.rule if request.url_rule else '<404>'}"
+        with self._lock:
+            bucket = self.samples.get(route)
+            if bucket is None:
+                bucket = self.samples[route] = deque(maxlen=self.window)
+            bucket.append((wall, prof.db_time, prof.queries, prof.render_time))
+        response.headers["Server-Timing"] = (
+            f"total;dur={wall * 1000:.1f}, db;dur={prof.db_time * 1000:.1f}, "
+            f"tpl;dur={prof.render_time * 1000:.1f}")
+        response.headers["X-Profile-Queries"] = str(prof.queries)
+        return response
+
+    def summary(self):
+        # Statistici pe rută, cele mai lente (p95) primele; timpii în milisecunde
+        with self._lock:
+            snapshot = {route: list(samples) for route, samples in self.samples.items()}
+        rows = []
+        for route, samples in snapshot.items():
+            wall = sorted(s[0] * 1000 for s in samples)
+            db = sorted(s[1] * 1000 for s in samples)
+            queries = sorted(s[2] for s in samples)
+            render = sorted(s[3] * 1000 for s in samples)
+            rows.append({
+                "route": route,
+                "count": len(samples),
+                "wall_p50": percentile(wall, 50),
+                "wall_p95": percentile(wall, 95),
+                "wall_p99": percentile(wall, 99),
+                "db_p50": percentile(db, 50),
+                "db_p95": percentile(db, 95),
+                "db_p99": percentile(db, 99),
+                "queries_p50": percentile(queries, 50),
+                "queries_max": queries[-1],
+                "render_p95": percentile(render, 95),
+            })
+        rows.sort(key=lambda r: r["wall_p95"], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
@@ -0,0 +1,191 @@
+"""Exporturi de lună pe coloane (NumPy): vânzări și achiziții, grupate și pivotate vectorizat.
+
+Rulare: python reports.py sales|purchases AAAA-LL prefix_fișier [csv|npz]
+
+Rândurile nu trec prin RealDictCursor: interogarea e rulată ca
+COPY ... TO STDOUT (FORMAT binary), iar buffer-ul e citit direct ca array
+NumPy structurat. Pentru asta toate coloanele sursă au lățime fixă și sunt
+NOT NULL (int4 / int8 / float8 / date); sumele de bani circulă în bani
+(int8), numele se adaugă la final, doar pentru rândurile agregate.
+"""
+import csv
+import io
+import sys
+from datetime import date
+
+import numpy as np
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# Tipurile acceptate în COPY binar -> tipul NumPy (big-endian, ca pe fir)
+PG_TYPES = {"int4": ">i4", "int8": ">i8", "float8": ">f8", "date": ">i4"}
+# Zilele dintre 1970-01-01 (NumPy) și 2000-01-01 (Postgres)
+PG_EPOCH_DAYS = 10957
+
+# Sursele exporturilor: (SQL cu %(start)s / %(end)s, coloane)
+SOURCES = {
+    "sales": ("""
+        SELECT analytics_day(o.data)                 AS day,
+               oc.id_product                         AS id_product,
+               oc.quantity                           AS quantity,
+               (oc.quantity * oc.price * 100)::int8  AS amount_cents
+        FROM order_content oc
+        JOIN orders o ON o.id_order = oc.id_order
+        WHERE o.progress <> 'cancelled' AND o.data >= %(start)s::timestamp AT TIME ZONE 'Europe/Bucharest'
+          AND o.data < %(end)s::timestamp AT TIME ZONE 'Europe/Bucharest'
+    """, [("day", "date"), ("id_product", "int4"), ("quantity", "int4"), ("amount_cents", "int8")]),
+    "purchases": ("""
+        SELECT analytics_day(po.data)                  AS day,
+               pp.id_partner                           AS id_partner,
+               pp.id_stock                             AS id_product,
+               poc.quantity                            AS quantity,
+               (poc.quantity * poc.price * 100)::int8  AS amount_cents
+        FROM partner_order_content poc
+        JOIN partner_orders po   ON po.id_order = poc.id_order
+        JOIN partner_products pp ON pp.id_product = poc.id_product
+        WHERE po.status <> 'cancelled' AND po.data >= %(start)s::timestamp AT TIME ZONE 'Europe/Bucharest'
+          AND po.data < %(end)s::timestamp AT TIME ZONE 'Europe/Bucharest'
+    """, [("day", "date"), ("id_partner", "int4"), ("id_product", "int4"),
+          ("quantity", "int4"), ("amount_cents", "int8")]),
+}
+
+
+def fetch_columns(db, sql, columns, params=None):
+    # Rulează sql prin COPY binar; întoarce {nume: ndarray} în ordinea din `columns`
+    query = db.cursor.mogrify(sql, params).decode() if params else sql
+    buf = io.BytesIO()
+    with db.connection:
+        db.cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", buf)
+    raw = buf.getbuffer()
+    if bytes(raw[:11]) != COPY_SIGNATURE:
+        raise ValueError("răspuns COPY binar invalid")
+    start = 19 + int.from_bytes(raw[15:19], "big")
+    # fiecare rând: int16 nr. câmpuri, apoi pentru fiecare câmp int32 lungime + valoare
+    fields = [("_count", ">i2")]
+    for name, pgtype in columns:
+        fields += [(f"_len_{name}", ">i4"), (name, PG_TYPES[pgtype])]
+    dtype = np.dtype(fields)
+    body = raw[start:len(raw) - 2]  # ultimele 2 octeți: terminatorul -1
+    if len(body) % dtype.itemsize:
+        raise ValueError("rânduri de lungime variabilă: toate coloanele trebuie să fie NOT NULL")
+    records = np.frombuffer(body, dtype=dtype)
+    if len(records) and (records["_count"] != len(columns)).any():
+        raise ValueError("număr neașteptat de coloane în COPY")
+    out = {}
+    for name, pgtype in columns:
+        if (records[f"_len_{name}"] != dtype[name].itemsize).any():
+            raise ValueError(f"coloana {name} conține NULL sau are alt tip decât {pgtype}")
+        col = records[name].astype(dtype[name].newbyteorder("="))
+        if pgtype == "date":
+            col = (col.astype(np.int64) + PG_EPOCH_DAYS).astype("datetime64[D]")
+        out[name] = col
+    del records, body, raw
+    buf.close()
+    return out
+
+
+def group_by(cols, keys, sums):
+    # Grupare vectorizată: {chei..., sume..., rows} cu un rând per combinație de chei
+    if len(keys) == 1:
+        labels, inverse = np.unique(cols[keys[0]], return_inverse=True)
+        result = {keys[0]: labels}
+    else:
+        stacked = np.rec.fromarrays([cols[k] for k in keys], names=keys)
+        labels, inverse = np.unique(stacked, return_inverse=True)
+        result = {k: np.asarray(labels[k]) for k in keys}
+    n = len(labels)
+    for name in sums:
+        total = np.bincount(inverse, weights=cols[name], minlength=n)
+        result[name] = total.astype(np.int64) if cols[name].dtype.kind in "iu" else total
+    result["rows"] = np.bincount(inverse, minlength=n)
+    return result
+
+
+def pivot(cols, row, column, value):
+    # (etichete rânduri, etichete coloane, matrice cu suma lui value pe fiecare celulă)
+    row_labels, ri = np.unique(cols[row], return_inverse=True)
+    col_labels, ci = np.unique(cols[column], return_inverse=True)
+    flat = np.bincount(ri * len(col_labels) + ci, weights=cols[value],
+                       minlength=len(row_labels) * len(col_labels))
+    matrix = flat.reshape(len(row_labels), len(col_labels))
+    if cols[value].dtype.kind in "iu":
+        matrix = matrix.astype(np.int64)
+    return row_labels, col_labels, matrix
+
+
+def _names(db, table, id_col, ids):
+    # Nume pentru id-urile agregate (o singură interogare mică)
+    with db.connection:
+        db.cursor.execute(f"SELECT {id_col} AS id, name FROM {table} WHERE {id_col} = ANY(%s)",
+                          ([int(i) for i in ids],))
+        found = {r["id"]: r["name"] for r in db.cursor.fetchall()}
+    return np.array([found.get(int(i), "") for i in ids], dtype=str)
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
+
+
+def sales_month(db, year, month):
+    # (totaluri pe produs, pivot produs x zi al valorii vândute)
+    start, end = month_bounds(year, month)
+    cols = fetch_columns(db, *SOURCES["sales"], {"start": start, "end": end})
+    totals = group_by(cols, ["id_product"], ["quantity", "amount_cents"])
+    totals["name"] = _names(db, "stock", "id_product", totals["id_product"])
+    products, days, matrix = pivot(cols, "id_product", "day", "amount_cents")
+    by_day = {"id_product": products, "name": _names(db, "stock", "id_product", products)}
+    for j, day in enumerate(days):
+        by_day[str(day)] = matrix[:, j]
+    return totals, by_day
+
+
+def purchases_month(db, year, month):
+    # (totaluri pe partener și produs, pivot partener x zi al valorii cumpărate)
+    start, end = month_bounds(year, month)
+    cols = fetch_columns(db, *SOURCES["purchases"], {"start": start, "end": end})
+    totals = group_by(cols, ["id_partner", "id_product"], ["quantity", "amount_cents"])
+    totals["partner"] = _names(db, "partners", "id_partner", totals["id_partner"])
+    totals["product"] = _names(db, "stock", "id_product", totals["id_product"])
+    partners, days, matrix = pivot(cols, "id_partner", "day", "amount_cents")
+    by_day = {"id_partner": partners, "partner": _names(db, "partners", "id_partner", partners)}
+    for j, day in enumerate(days):
+        by_day[str(day)] = matrix[:, j]
+    return totals, by_day
+
+
+def write_table(table, path, fmt="csv"):
+    # Scrie un tabel pe coloane; coloanele *_cents și zilele pivotului apar în lei la CSV
+    if fmt == "npz":
+        np.savez_compressed(path, **{k: np.asarray(v) for k, v in table.items()})
+        return
+    names = list(table)
+    money = [k.endswith("_cents") or k[:1].isdigit() for k in names]
+    with open(path, "w", encoding="utf-8", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow([k[:-6] if k.endswith("_cents") else k for k in names])
+        columns = [table[k].tolist() for k in names]
+        for row in zip(*columns):
+            writer.writerow([f"{v / 100:.2f}" if m else v for v, m in zip(row, money)])
+
+
+def main(argv):
+    from db import Database
+
+    if len(argv) not in (3, 4) or argv[0] not in ("sales", "purchases"):
+        print(__doc__)
+        return 2
+    kind, period, prefix = argv[:3]
+    fmt = argv[3] if len(argv) == 4 else "csv"
+    year, month = map(int, period.split("-"))
+    db = Database()
+    try:
+        build = sales_month if kind == "sales" else purchases_month
+        totals, by_day = build(db, year, month)
+        write_table(totals, f"{prefix}_{kind}_{period}_totals.{fmt}", fmt)
+        write_table(by_day, f"{prefix}_{kind}_{period}_by_day.{fmt}", fmt)
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
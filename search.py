@@ -0,0 +1,161 @@
+"""Căutare de produse după nume: prefix, subșir și fuzzy, cu scor de relevanță.
+
+Cu extensia pg_trgm (migrarea 7) căutarea rulează în Postgres pe indexul GIN
+idx_stock_name_trgm. Fără ea, ProductSearch ține în memorie un index de
+trigrame (nume + tip); rândurile găsite se citesc apoi din stock după id,
+așa că prețul și cantitatea sunt mereu la zi. Indexul din memorie se
+reconstruiește într-un fir separat doar după modificări de catalog (produse
+noi, import), cel mult o dată la SEARCH_INDEX_MIN_AGE secunde.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+MODES = ("prefix", "substring", "fuzzy")
+# Fracțiunea minimă din trigramele căutării care trebuie să apară în nume (ca word_similarity)
+FUZZY_THRESHOLD = 0.6
+
+
+def trigrams(text):
+    # Trigramele textului (litere mici), cu padding ca în pg_trgm
+    padded = "  " + text.lower() + " "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def base_score(name, q):
+    # 3 = potrivire exactă, 2 = prefix, 1 = subșir, 0 = doar fuzzy
+    if name == q:
+        return 3
+    if name.startswith(q):
+        return 2
+    return 1 if q in name else 0
+
+
+class TrigramIndex:
+    """Index n-gram în memorie: trigramă -> id-urile produselor care o conțin."""
+
+    def __init__(self, rows):
+        self.names = {}
+        self.types = {}
+        self.postings = {}
+        for row in rows:
+            pid = row["id_product"]
+            self.names[pid] = row["name"].lower()
+            self.types[pid] = row["type"]
+            for tri in trigrams(row["name"]):
+                self.postings.setdefault(tri, set()).add(pid)
+
+    def _containing(self, q):
+        # Produsele al căror nume conține q (prin intersecția listelor de trigrame interioare)
+        inner = sorted((self.postings.get(q[i:i + 3], set()) for i in range(len(q) - 2)), key=len)
+        candidates = set.intersection(*inner) if inner else self.names.keys()
+        return {pid for pid in candidates if q in self.names[pid]}
+
+    def search(self, q, type=None, mode="fuzzy", limit=20, offset=0):
+        # [(id, scor)] ordonate după relevanță, apoi după nume
+        q = q.strip().lower()
+        matches = self._containing(q)
+        if mode == "prefix":
+            matches = {pid for pid in matches if self.names[pid].startswith(q)}
+        q_tris = trigrams(q)
+        if mode == "fuzzy":
+            shared = Counter()
+            for tri in q_tris:
+                for pid in self.postings.get(tri, ()):
+                    shared[pid] += 1
+            matches.update(pid for pid, n in shared.items() if n / len(q_tris) >= FUZZY_THRESHOLD)
+        else:
+            shared = {pid: len(q_tris & trigrams(self.names[pid])) for pid in matches}
+        ranked = (
+            (-(base_score(self.names[pid], q) + shared[pid] / len(q_tris)), self.names[pid], pid)
+            for pid in matches
+            if type is None or self.types[pid] == type
+        )
+        best = heapq.nsmallest(offset + limit, ranked)[offset:]
+        return [(pid, -neg) for neg, _, pid in best]
+
+
+class ProductSearch:
+    """Punctul de intrare folosit de /api/products/search."""
+
+    def __init__(self, db, min_age=None):
+        self.db = db
+        self.min_age = float(min_age if min_age is not None else os.getenv("SEARCH_INDEX_MIN_AGE") or 30)
+        self._trigram = None
+        self._checked_at = 0.0
+        self._index = None
+        self._built_at = 0.0
+        self._dirty = False
+        self._rebuilding = False
+        self._lock = threading.Lock()
+        # Indexul conține doar nume și tipuri: comenzile (care schimbă cantități) nu îl afectează
+        db.on_catalog_change(self.invalidate)
+
+    def invalidate(self):
+        # Marchează indexul ca vechi și pornește reconstruirea în fundal (un singur fir)
+        with self._lock:
+            if self._index is None:
+                return  # primul search îl construiește oricum
+            self._dirty = True
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="search-index", daemon=True).start()
+
+    def _build(self):
+        return TrigramIndex(self.db.get_stock(final_only=False, stream=True))
+
+    def _rebuild(self):
+        # Construiește indexul nou în afara request-urilor și îl înlocuiește pe cel vechi;
+        # căutările folosesc indexul vechi până la înlocuire
+        try:
+            while True:
+                wait = self._built_at + self.min_age - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                with self._lock:
+                    self._dirty = False
+                index = self._build()
+                with self._lock:
+                    self._index = index
+                    self._built_at = time.monotonic()
+                    if not self._dirty:
+                        self._rebuilding = False
+                        return
+        except Exception:
+            log.exception("reconstruirea indexului de căutare a eșuat")
+            with self._lock:
+                self._rebuilding = False
+        finally:
+            self.db.release()
+
+    def _memory_index(self):
+        index = self._index
+        if index is not None:
+            return index
+        with self._lock:
+            # doar prima construire are loc pe calea request-ului
+            if self._index is None:
+                self._index = self._build()
+                self._built_at = time.monotonic()
+            return self._index
+
+    def _use_trigram(self):
+        # Fără pg_trgm se reverifică periodic, ca extensia instalată ulterior să fie folosită
+        now = time.monotonic()
+        if self._trigram is None or (not self._trigram and now - self._checked_at >= self.min_age):
+            self._trigram = self.db.has_trigram_search()
+            self._checked_at = now
+        return self._trigram
+
+    def search(self, q, type=None, mode="fuzzy", limit=20, offset=0):
+        if self._use_trigram():
+            return self.db.search_products(q, type, mode, limit, offset)
+        hits = self._memory_index().search(q, type, mode, limit, offset)
+        rows = {r["id_product"]: r for r in self.db.get_products_by_ids([pid for pid, _ in hits])}
+        return [dict(rows[pid], score=score) for pid, score in hits if pid in rows]
@@ -0,0 +1,28 @@
+def allocate(wanted, offers):
+    """Împarte cantitățile cerute între furnizori, de la cel mai ieftin în sus.
+
+    wanted {id_stock: cantitate}
+    offers listă de oferte (id_product, id_stock, id_partner, price, quantity),
+           în orice ordine
+    Întoarce (linii pe partener {id_partner: [(id_product, cantitate, preț)]},
+              lipsuri {id_stock: cantitate neacoperită}).
+    Cum prețul e liniar în cantitate, alegerea lacomă după preț are cost minim.
+    """
+    by_stock = {}
+    for offer in offers:
+        by_stock.setdefault(offer["id_stock"], []).append(offer)
+    lines, shortages = {}, {}
+    for sid, qty in wanted.items():
+        remaining = qty
+        for offer in sorted(by_stock.get(sid, []), key=lambda o: (o["price"], o["id_product"])):
+            if remaining == 0:
+                break
+            take = min(remaining, offer["quantity"])
+            if take <= 0:
+                continue
+            lines.setdefault(offer["id_partner"], []).append(
+                (offer["id_product"], take, offer["price"]))
+            remaining -= take
+        if remaining:
+            shortages[sid] = remaining
+    return lines, shortages
@@ -0,0 +1,94 @@
+"""Agregatele incrementale (trigger-e + analytics_compact) trebuie să fie identice cu REBUILD.
+
+Rulează pe baza de date din .env (schema e adusă la zi ca la pornirea aplicației);
+totul se face într-o singură tranzacție, anulată la final.
+"""
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import analytics  # noqa: E402
+
+TABLES = {
+    "sales_daily_product": "day, id_product",
+    "sales_daily_customer": "day, id_client",
+    "sales_daily_employee": "day, id_employee",
+    "sales_order_product": "day, id_order, id_product",
+}
+
+
+@pytest.fixture
+def db():
+    from db import Database
+
+    try:
+        database = Database()
+    except psycopg2.OperationalError as exc:
+        pytest.skip(f"Postgres indisponibil: {exc}")
+    yield database
+    database.connection.rollback()
+    database.close()
+
+
+def snapshot(cur):
+    out = {}
+    for table, keys in TABLES.items():
+        cur.execute(f"SELECT * FROM {table} ORDER BY {keys}")
+        out[table] = [dict(r) for r in cur.fetchall()]
+    return out
+
+
+def insert(cur, sql, params):
+    cur.execute(sql + " RETURNING *", params)
+    return cur.fetchone()
+
+
+def test_incremental_rollups_match_rebuild_after_multi_line_edits(db):
+    cur = db.cursor
+    cur.execute(analytics.REBUILD)
+    customer = insert(cur, "INSERT INTO customers (name,surname,username,password,email) "
+                           "VALUES ('T','Rollup','test_rollup_c','x','t@rollup')", ())
+    employee = insert(cur, "INSERT INTO employees (name,surname,department,salary,email,"
+                           "phone_number,address,username,password) "
+                           "VALUES ('T','Rollup','sales',1,'e@rollup','-','-','test_rollup_e','x')", ())
+    p1, p2 = (insert(cur, "INSERT INTO stock (name,price,description,quantity,type) "
+                          "VALUES (%s, 2.50, '', 1000000, 'final')", (name,))["id_product"]
+              for name in ("Test rollup A", "Test rollup B"))
+
+    def order(data="now()"):
+        return insert(cur, f"INSERT INTO orders (id_client, data, progress, id_employee) "
+                           f"VALUES (%s, {data}, 'pending', %s)",
+                      (customer["id_customer"], employee["id"]))["id_order"]
+
+    def lines(order_id, *items):
+        cur.execute(
+            "INSERT INTO order_content (id_order, id_product, quantity, price) "
+            "SELECT %s, p, q, 2.50 FROM unnest(%s::int[], %s::int[]) AS t(p, q) RETURNING id_item",
+            (order_id, [p for p, _ in items], [q for _, q in items]))
+        return [r["id_item"] for r in cur.fetchall()]
+
+    a = order()
+    first_p1, line_p2 = lines(a, (p1, 2), (p2, 1))
+    cur.execute("SELECT analytics_compact()")
+    # a doua linie pentru același produs, într-o instrucțiune separată
+    lines(a, (p1, 3))
+    cur.execute("UPDATE order_content SET quantity = 4 WHERE id_item = %s", (line_p2,))
+    cur.execute("SELECT analytics_compact()")
+    cur.execute("DELETE FROM order_content WHERE id_item = %s", (first_p1,))
+
+    b = order("now() - interval '1 day'")
+    lines(b, (p1, 1), (p1, 2), (p2, 5))
+    cur.execute("UPDATE orders SET progress = 'cancelled' WHERE id_order = %s", (b,))
+    cur.execute("SELECT analytics_compact()")
+    cur.execute("UPDATE orders SET progress = 'pending', data = now() WHERE id_order = %s", (b,))
+
+    c = order()
+    lines(c, (p2, 1), (p1, 1))
+    cur.execute("DELETE FROM orders WHERE id_order = %s", (c,))
+    cur.execute("SELECT analytics_compact()")
+
+    cur.execute("SELECT COUNT(*) AS n FROM sales_rollup_log")
+    assert cur.fetchone()["n"] == 0
+    incremental = snapshot(cur)
+    cur.execute(analytics.REBUILD)
+    assert incremental == snapshot(cur)
@@ -0,0 +1,54 @@
+import json
+import threading
+
+from cache import CatalogCache, LocalBackend
+
+
+def make_cache():
+    return CatalogCache(dumps=json.dumps, backend=LocalBackend(), ttl=60)
+
+
+def test_load_is_cached():
+    cache = make_cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [{"id_product": 1, "quantity": 5}]
+
+    first = cache.get_or_load("stock", loader)
+    assert cache.get_or_load("stock", loader) == first
+    assert len(calls) == 1
+
+
+def test_invalidate_during_load_does_not_store_stale_rows():
+    cache = make_cache()
+    stock = {"quantity": 5}
+    loading, invalidated = threading.Event(), threading.Event()
+
+    def slow_loader():
+        rows = [dict(stock)]  # citește stocul vechi...
+        loading.set()
+        invalidated.wait(5)   # ...iar între timp stocul se schimbă
+        return rows
+
+    result = {}
+    t = threading.Thread(target=lambda: result.update(entry=cache.get_or_load("stock", slow_loader)))
+    t.start()
+    loading.wait(5)
+    stock["quantity"] = 3
+    cache.invalidate()
+    invalidated.set()
+    t.join(5)
+
+    # cererea în curs primește rezultatul ei, dar acesta nu rămâne în cache
+    assert json.loads(result["entry"][1]) == [{"quantity": 5}]
+    fresh = cache.get_or_load("stock", lambda: [dict(stock)])
+    assert json.loads(fresh[1]) == [{"quantity": 3}]
+
+
+def test_load_after_invalidate_is_stored():
+    cache = make_cache()
+    cache.invalidate()
+    cache.get_or_load("stock", lambda: [{"quantity": 1}])
+    assert cache.backend.get("stock") is not None